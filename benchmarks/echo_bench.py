@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmarks of the echo/render path of BaseWindow.
+
+Every scenario (echo mode x line mix) runs in its own process, under Xvfb
+when there is no display, and the results are written as JSON:
+
+    python -m benchmarks.echo_bench -o results.json
+    python -m benchmarks.echo_bench -o new.json -b results.json
+    python -m benchmarks.echo_bench --replay echo.log --speed 10 -o replay.json
+
+With a baseline (-b) the exit code is 1 when a result regressed more than
+the tolerance (lower lines/s, higher p99 latency or peak RSS).
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MODES = ("add_echo", "add_echo3")
+LINE_MIXES = dict(
+    plain=[dict(ts=False)],
+    styled=[
+        dict(ts=False, fg="blue", bold=True),
+        dict(ts=False, fg="red", bg="yellow", italic=True),
+    ],
+    timestamped=[dict(ts=True, ts_style=dict(fg="grey"))],
+    logged=[dict(ts=True, log=True)],
+    mixed=[
+        dict(ts=False),
+        dict(ts=True),
+        dict(ts=False, fg="blue", bold=True),
+        dict(ts=True, log=True),
+    ],
+)
+# metric -> True if higher is better
+COMPARED_METRICS = dict(lines_per_sec=True, lag_p99_ms=False, peak_rss_kb=False)
+
+
+def get_peak_rss():
+    """Peak resident set size of this process in KB, None if unknown."""
+    if resource is None:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def get_percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0
+
+    return values[min(int(len(values) * pct / 100), len(values) - 1)]
+
+
+def start_xvfb(display=":99"):
+    """Start Xvfb if there is no display, return the process (or None)."""
+    if not sys.platform.startswith("linux") or os.environ.get("DISPLAY"):
+        return None
+
+    try:
+        proc = subprocess.Popen(["Xvfb", display, "-screen", "0", "1280x1024x24"])
+    except OSError:
+        return None
+
+    os.environ["DISPLAY"] = display
+    time.sleep(1)
+    return proc
+
+
+def run_scenario(mode, mix, count=20000, rate=0, width=80, **kwargs):
+    """Echo count lines in a BaseWindow, return the results dict."""
+    import wx
+
+    from wxbreads.base import BaseWindow
+    from wxbreads.replay import LogReplay
+
+    folder = tempfile.mkdtemp(prefix="wxbreads-bench-")
+    log_file = os.path.join(folder, "echo.log")
+    styles = []
+    for style in LINE_MIXES.get(mix, []):
+        style = dict(style)
+        if style.pop("log", False):
+            style.update(log_files=[log_file])
+
+        styles.append(style)
+
+    class BenchWindow(BaseWindow):
+        virtual_echo = kwargs.get("virtual", False)
+
+        def __init__(self, **kw):
+            super(BenchWindow, self).__init__(**kw)
+            self.setup_base_ui(with_big=False)
+            self.setup_timers(clock_ms=0, echo_ms=kwargs.get("echo_ms", 0))
+            self.lags = []  # add_echo3 only, add_echo has echo_metrics
+            self.done = 0
+            self.Show()
+
+        def echo_chunk(self, lines, posted):
+            for text, style in lines:
+                self.add_echo3(text, **style)
+
+            self.lags.append(time.time() - posted)
+            self.done += len(lines)
+
+    app = wx.App()
+    window = BenchWindow(size=(1000, 700))
+    payload = "x" * max(width - 16, 0)
+    result = dict(mode=mode, mix=mix, count=count, rate=rate, width=width)
+
+    replay = None
+    if mode == "replay":
+        replay = LogReplay(kwargs["replay"], window.add_echo, kwargs.get("speed", 0))
+        result.update(replay=kwargs["replay"], speed=replay.speed)
+
+    def feed():
+        if replay is not None:
+            replay.run()
+            return
+
+        chunk = []
+        start = time.time()
+        for i in range(count):
+            text = "line {:>8} {}".format(i, payload)
+            style = styles[i % len(styles)]
+            if mode == "add_echo":
+                window.add_echo(text, **style)
+            else:
+                chunk.append((text, style))
+                if len(chunk) == 100 or i == count - 1:
+                    wx.CallAfter(window.echo_chunk, chunk, time.time())
+                    chunk = []
+
+            if rate and i % 100 == 99:
+                delay = start + (i + 1) / rate - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+    def check_done():
+        if replay is not None:
+            metrics = window.get_echo_metrics()
+            done = replay.done and metrics["rendered"] >= replay.lines
+            done = done and not metrics["queue_depth"]
+        elif mode == "add_echo":
+            metrics = window.get_echo_metrics()
+            done = metrics["rendered"] >= count and not metrics["queue_depth"]
+        else:
+            metrics = {}
+            done = window.done >= count
+
+        if not done:
+            wx.CallLater(10, check_done)
+            return
+
+        elapsed = time.time() - started[0]
+        if replay is not None:
+            result.update(count=replay.lines, replay_behind_s=replay.behind)
+
+        if mode != "add_echo3":
+            lags = dict((k, v) for k, v in metrics.items() if k.startswith("lag_"))
+        else:
+            lags = dict(
+                ("lag_p{}_ms".format(pct), get_percentile(window.lags, pct) * 1000)
+                for pct in (50, 90, 99)
+            )
+            lags.update(lag_max_ms=max(window.lags or [0]) * 1000)
+
+        window.log_sinks.flush()
+        result.update(lags)
+        result.update(
+            elapsed=elapsed,
+            lines_per_sec=result["count"] / elapsed if elapsed else 0,
+            peak_rss_kb=get_peak_rss(),
+            dropped=window.echo_dropped,
+        )
+        if hasattr(window.rtc, "ring"):
+            result.update(rtc_lines=len(window.rtc.ring), rtc_chars=None)
+        else:
+            result.update(
+                rtc_lines=window.rtc.GetNumberOfLines(),
+                rtc_chars=window.rtc.GetLastPosition(),
+            )
+
+        if os.path.exists(log_file):
+            result.update(log_bytes=os.path.getsize(log_file))
+
+        window.stop_timers()
+        window.log_sinks.close()
+        window.Destroy()
+        app.ExitMainLoop()
+
+    def start():
+        started.append(time.time())
+        feeder = threading.Thread(target=feed, name="feeder")
+        feeder.daemon = True
+        feeder.start()
+        check_done()
+
+    started = []
+    wx.CallLater(200, start)
+    app.MainLoop()
+    shutil.rmtree(folder, ignore_errors=True)
+    return result
+
+
+def run_all(args):
+    results = []
+    runs = [(mode, mix) for mode in args.modes for mix in args.mixes]
+    if args.replay:  # same window config, real traffic instead of mixes
+        runs = [("replay", os.path.basename(args.replay))]
+
+    for mode, mix in runs:
+        cmd = [
+            sys.executable,
+            "-m",
+            "benchmarks.echo_bench",
+            "--run",
+            "{}:{}".format(mode, mix),
+            "--count",
+            str(args.count),
+            "--rate",
+            str(args.rate),
+            "--width",
+            str(args.width),
+            "--echo-ms",
+            str(args.echo_ms),
+        ]
+        if args.virtual:
+            cmd.append("--virtual")
+
+        if args.replay:
+            cmd.extend(["--replay", args.replay, "--speed", str(args.speed)])
+
+        output = subprocess.check_output(cmd)
+        result = json.loads(output.decode("utf-8").strip().splitlines()[-1])
+        print(
+            "{mode:>9} {mix:<12} {lines_per_sec:>10.0f} lines/s "
+            "p99 {lag_p99_ms:>8.1f}ms rss {peak_rss_kb}KB".format(**result)
+        )
+        results.append(result)
+
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Return the list of regressions of results against baseline."""
+    olds = dict(((r["mode"], r["mix"]), r) for r in baseline.get("results", []))
+    regressions = []
+    for result in results:
+        old = olds.get((result["mode"], result["mix"]))
+        if not old:
+            continue
+
+        for key, higher_better in COMPARED_METRICS.items():
+            new_value, old_value = result.get(key), old.get(key)
+            if not (new_value and old_value):
+                continue
+
+            change = (new_value - old_value) / old_value
+            if (-change if higher_better else change) > tolerance:
+                regressions.append(
+                    "{}:{} {} {:.1f} -> {:.1f} ({:+.0%})".format(
+                        result["mode"], result["mix"], key, old_value, new_value, change
+                    )
+                )
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--run", help="run one mode:mix, print JSON")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument(
+        "--mixes", nargs="+", default=sorted(LINE_MIXES), choices=sorted(LINE_MIXES)
+    )
+    parser.add_argument("--count", type=int, default=20000, help="lines per run")
+    parser.add_argument("--rate", type=float, default=0, help="lines/s, 0 max")
+    parser.add_argument("--width", type=int, default=80, help="chars per line")
+    parser.add_argument("--echo-ms", type=int, default=0, help="echo timer ms")
+    parser.add_argument("--virtual", action="store_true", help="use LogView")
+    parser.add_argument("--replay", help="echo this log file instead of mixes")
+    parser.add_argument(
+        "--speed", type=float, default=0, help="replay speed, 1 original, 0 max"
+    )
+    parser.add_argument("-o", "--output", help="write results to this JSON file")
+    parser.add_argument("-b", "--baseline", help="compare with this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    if args.run:
+        mode, mix = args.run.split(":", 1)
+        result = run_scenario(
+            mode,
+            mix,
+            count=args.count,
+            rate=args.rate,
+            width=args.width,
+            echo_ms=args.echo_ms,
+            virtual=args.virtual,
+            replay=args.replay,
+            speed=args.speed,
+        )
+        print(json.dumps(result))
+        return 0
+
+    xvfb = start_xvfb()
+    try:
+        results = run_all(args)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+
+    report = dict(
+        created=time.strftime("%Y-%m-%d %H:%M:%S"),
+        python=sys.version.split()[0],
+        platform=sys.platform,
+        virtual=args.virtual,
+        results=results,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+        for regression in regressions:
+            print("REGRESSION", regression)
+
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
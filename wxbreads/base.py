@@ -3,11 +3,13 @@
 
 from __future__ import unicode_literals
 
+import logging
 import os.path
 import tempfile
 import traceback
 from datetime import datetime
 from functools import partial
+from time import time
 
 import six
 import windbreads.utils as wdu
@@ -18,7 +20,9 @@ import wx.lib.delayedresult as delayedresult
 import wx.lib.scrolledpanel as scrolled
 from wx.lib.busy import BusyInfo
 
+import wxbreads.echo as wxe
 import wxbreads.images as wxi
+import wxbreads.logsink as wxls
 import wxbreads.utils as wxu
 import wxbreads.widgets as wxw
 
@@ -48,6 +52,32 @@ class BaseBase(object):
     remember_window = False
     show_version_in_title = True
     clear_echo_row = 0
+    echo_styles = {}  # name -> echo style kwargs, "ts" styles timestamps
+    echo_index_lines = 0  # index the last N echo lines for find, 0 off
+    echo_max_lines = 0  # keep at most N lines in the echo pane, 0 no limit
+    echo_max_chars = 0  # keep at most N chars in the echo pane, 0 no limit
+    # max queued echo lines, 0 means unbounded, lines dropped when full are
+    # still written to their log files (timestamped when dropped)
+    echo_capacity = 0
+    echo_overflow = "drop_oldest"  # block/drop_oldest/drop_newest/coalesce
+    echo_budget_ms = 40  # max time spent echoing per timer tick
+    echo_busy_ms = 10  # echo timer interval while lines are queued
+    echo_repeat_window = 0  # collapse same lines within N seconds, 0 off
+    echo_repeat_log = "collapse"  # log files get: collapse (one "x N") / raw
+    echo_track_metrics = True  # see get_echo_metrics()
+    echo_highlights = []  # [(pattern, style kwargs), ...] see add_highlight
+    echo_ansi = False  # render ANSI colour escapes, plain text in log files
+    echo_snapshot_file = ""  # keep the last echo lines there to restore them
+    echo_snapshot_lines = 1000
+    log_buffer_size = 64 * 1024
+    log_flush_interval = 1.0  # seconds
+    log_max_bytes = 0  # rotate echo log files bigger than this, 0 never
+    log_daily = False  # rotate echo log files every day
+    log_backup_count = 0  # rotated segments kept per file, 0 keeps all
+    log_compress = None  # gz/xz to compress rotated segments
+    log_in_thread = True  # write echo log files from a LogWriter thread
+    log_queue_size = 100000
+    log_fsync = None  # None: never, 0: every commit, N: every N seconds
 
     def init_values(self, **kwargs):
         self.opened_dlg = None
@@ -62,9 +92,82 @@ class BaseBase(object):
         self.setting_wgts = []
         self.flat_menu = None
         self.support_chinese = len(fonts) >= self.min_chinese_fonts
-        self.echo_lines = []
+        self.echo_queue = wxe.EchoQueue(
+            kwargs.get("echo_capacity", self.echo_capacity),
+            kwargs.get("echo_overflow", self.echo_overflow),
+            on_drop=wxu.log_dropped_echo,
+        )
+        self.echo_lines = self.echo_queue  # backward compatibility
+        self.echo_styles = dict(self.echo_styles)
+        index_lines = kwargs.get("echo_index_lines", self.echo_index_lines)
+        self.echo_index = wxe.EchoIndex(index_lines) if index_lines else None
+        window = kwargs.get("echo_repeat_window", self.echo_repeat_window)
+        self.echo_repeats = wxe.EchoRepeats(window) if window else None
+        self.echo_repeat_log = kwargs.get("echo_repeat_log", self.echo_repeat_log)
+        self.echo_ansi = kwargs.get("echo_ansi", self.echo_ansi)
+        self.echo_highlight = wxu.HighlightRules()
+        for pattern, style in self.echo_highlights:
+            self.add_highlight(pattern, **style)
+
+        self.echo_channels = {}  # name -> EchoChannel
+        self.log_handlers = []  # (logger name, EchoHandler)
+        self.file_followers = []
+        self.command_runners = []
+        self.echo_snapshots = []
+        self.echo_snapshot_file = kwargs.get(
+            "echo_snapshot_file", self.echo_snapshot_file
+        )
+        self.echo_snapshot_lines = kwargs.get(
+            "echo_snapshot_lines", self.echo_snapshot_lines
+        )
+        self.echo_metrics = None
+        if kwargs.get("echo_track_metrics", self.echo_track_metrics):
+            self.echo_metrics = wxe.EchoMetrics()
+
+        self.log_sinks = wxls.LogSinks(
+            kwargs.get("log_buffer_size", self.log_buffer_size),
+            kwargs.get("log_flush_interval", self.log_flush_interval),
+            max_bytes=kwargs.get("log_max_bytes", self.log_max_bytes),
+            daily=kwargs.get("log_daily", self.log_daily),
+            backup_count=kwargs.get("log_backup_count", self.log_backup_count),
+            compress=kwargs.get("log_compress", self.log_compress),
+        )
+        if kwargs.get("log_in_thread", self.log_in_thread):
+            self.log_sinks = wxls.LogWriter(
+                self.log_sinks,
+                kwargs.get("log_queue_size", self.log_queue_size),
+                kwargs.get("log_fsync", self.log_fsync),
+            )
         self.is_echoing = False
         self.echoed_row = 0  # lines that echoed
+        self.echo_idle_ms = self.echo_interval = 0
+
+    @property
+    def echo_dropped(self):
+        return self.echo_queue.dropped
+
+    def get_echo_metrics(self):
+        """Snapshot of the echo pipeline (queue, lag, render and file work)."""
+        metrics = dict(queue_depth=len(self.echo_queue), dropped=self.echo_dropped)
+        if self.echo_metrics is not None:
+            metrics.update(self.echo_metrics.snapshot())
+
+        if self.echo_channels:
+            metrics.update(
+                channels=dict(
+                    (name, channel.get_metrics())
+                    for name, channel in self.echo_channels.items()
+                )
+            )
+
+        log_stats = self.log_sinks.get_stats()
+        metrics.update(
+            file_writes=log_stats["writes"],
+            file_write_ms=log_stats["write_ms"],
+            file_queued=log_stats["queued"],
+            file_dropped=log_stats["dropped"],
+        )
+        return metrics
 
     @property
     def screen_size(self):
@@ -164,12 +267,24 @@ class BaseBase(object):
             self.SetPosition((x, y))
 
     def other_clean_work(self):
+        self.log_sinks.flush()
         if self.can_remember_window():
             w, h = self.GetSize()
             x, y = self.GetPosition()
             self.config.update(app_w=str(w), app_h=str(h), app_x=str(x), app_y=str(y))
             self.dump_config()
 
+    def close_echo(self):
+        """Stop the threads feeding the echo pane, write what is pending.
+
+        Called by quick_quit whatever other_clean_work does.
+        """
+        self.remove_log_handlers()
+        self.stop_following()
+        self.stop_commands()
+        self.flush_echo_repeats(now=True)
+        [snapshot.flush() for snapshot in self.echo_snapshots]
+
     def get_lang(self):
         return "en"
 
@@ -180,7 +295,7 @@ class BaseBase(object):
         return None
 
     def tt(self, text):
-        return wdu.ttt(text, self.t)
+        return wxu.ttt(text, self.t)
 
     def set_font(self, wgt, font=None):
         wxw.set_font(wgt, font)
@@ -358,20 +473,223 @@ class BaseBase(object):
             panel.Layout()
 
     def echo_text(self, text="", **kwargs):
-        wxu.echo_text(self.rtc, text, **self.set_echo_defaults(kwargs))
+        wxu.echo_text(
+            self.rtc,
+            text,
+            max_lines=self.echo_max_lines,
+            max_chars=self.echo_max_chars,
+            **self.set_echo_defaults(kwargs)
+        )
+
+    def register_echo_style(self, name, **style):
+        """Register style kwargs (fg, bg, bold...) to echo with style=name."""
+        self.echo_styles[name] = style
+
+    def add_highlight(self, pattern, style=None, **kwargs):
+        """Style the parts of echoed lines matching pattern (a regex).
+
+        style: registered echo style name, or give fg/bg/bold... kwargs
+        literal: pattern is plain text, whole_line: style the whole line
+        """
+        if isinstance(style, six.string_types):
+            style = self.echo_styles.get(style, {})
+
+        kwargs.update(style or {})
+        self.echo_highlight.add(pattern, **kwargs)
 
     def set_echo_defaults(self, kwargs):
+        style = kwargs.pop("style", None)
+        if style:
+            if isinstance(style, six.string_types):
+                style = self.echo_styles.get(style, {})
+
+            [kwargs.setdefault(k, v) for k, v in style.items()]
+
+        if "ts" in self.echo_styles:
+            kwargs.setdefault("ts_style", self.echo_styles["ts"])
+
         kwargs.setdefault("t", self.t)
         kwargs.setdefault("log_mode", "a" if six.PY2 else "ab")
         kwargs.setdefault("log_files", [])
+        kwargs.setdefault("log_sinks", self.log_sinks)
+        if self.echo_highlight:
+            kwargs.setdefault("highlight", self.echo_highlight)
+
+        if self.echo_ansi:
+            kwargs.setdefault("ansi", True)
+
         return kwargs
 
+    def add_echo_channel(self, name, rtc, **kwargs):
+        """Route add_echo(text, channel=name) to rtc through its own queue.
+
+        kwargs: capacity, overflow, budget_ms, busy_ms, max_lines, max_chars,
+            log_files, metrics (defaults from the main echo settings)
+        """
+        import wxbreads.channel as wxc
+
+        kwargs.setdefault("capacity", self.echo_capacity)
+        kwargs.setdefault("overflow", self.echo_overflow)
+        kwargs.setdefault("budget_ms", self.echo_budget_ms)
+        kwargs.setdefault("busy_ms", self.echo_busy_ms)
+        kwargs.setdefault("max_lines", self.echo_max_lines)
+        kwargs.setdefault("max_chars", self.echo_max_chars)
+        kwargs.setdefault("metrics", self.echo_metrics is not None)
+        self.remove_echo_channel(name)
+        channel = self.echo_channels[name] = wxc.EchoChannel(name, rtc, **kwargs)
+        return channel
+
+    def remove_echo_channel(self, name):
+        channel = self.echo_channels.pop(name, None)
+        if channel is not None:
+            channel.close()
+
     def add_echo(self, text="", **kwargs):
+        channel = kwargs.pop("channel", None)
+        if channel is not None:
+            channel = self.echo_channels[channel]
+            kwargs.setdefault("log_files", channel.log_files)
+            return channel.add(text, self.set_echo_defaults(kwargs))
+
         if self.clear_echo_row and kwargs.get("nl", True):
             self.echoed_row += 1
             kwargs.setdefault("clear", self.echoed_row % self.clear_echo_row == 0)
 
-        self.echo_lines.append((text, self.set_echo_defaults(kwargs)))
+        self.set_echo_defaults(kwargs)
+        if self.echo_metrics is not None:
+            kwargs.update(echo_ts=time())
+
+        if self.echo_repeats is None or kwargs.get("no_echo"):
+            return self.queue_echo(text, kwargs)
+
+        with self.echo_queue.not_full:  # no other line between check and put
+            count, ended = self.echo_repeats.check(text, kwargs)
+            if ended:
+                self.log_echo_repeats(ended)
+
+            if count > 1:
+                kwargs.update(
+                    echo_repeat=count,
+                    echo_repeat_from=count - 1,
+                    echo_repeat_log=self.echo_repeat_log,
+                )
+                return self.echo_queue.put_repeat((text, kwargs))
+
+            return self.queue_echo(text, kwargs)
+
+    def queue_echo(self, text, kwargs):
+        if self.echo_index is not None and not kwargs.get("no_echo"):
+            utext = wxu.to_echo_text(text, kwargs.get("source", "echo"))
+            utext = wxu.cat_echo_text(text=utext, **kwargs)
+            if kwargs.get("ansi"):
+                utext = wxe.strip_ansi(utext)
+
+            kwargs.update(echo_seq=self.echo_index.add(utext))
+
+        return self.echo_queue.put((text, kwargs))
+
+    def log_echo_repeats(self, ended, now=False):
+        """Queue the "line x N" log record of an ended run of repeats.
+
+        now: write it at once (when quitting, the queue is not drained)
+        """
+        if self.echo_repeat_log != "collapse":
+            return
+
+        text, kwargs, count = ended
+        kwargs.update(no_echo=True, echo_repeat=count)
+        if now:
+            wxu.get_echo_runs(text, **kwargs)
+        else:
+            self.echo_queue.put((text, kwargs))
+
+    def flush_echo_repeats(self, expired_only=False, now=False):
+        """Log the count of the current run of repeats, see EchoRepeats.end."""
+        if self.echo_repeats is not None:
+            ended = self.echo_repeats.end(expired_only)
+            if ended:
+                self.log_echo_repeats(ended, now)
+
+    def add_echo_lines(self, texts, **kwargs):
+        """add_echo for lines sharing kwargs, queued with a single wakeup."""
+        per_line = self.echo_repeats is not None or self.echo_index is not None
+        if per_line or self.clear_echo_row:
+            return sum(bool(self.add_echo(text, **dict(kwargs))) for text in texts)
+
+        owner = self
+        channel = kwargs.pop("channel", None)
+        if channel is not None:
+            owner = self.echo_channels[channel]
+            kwargs.setdefault("log_files", owner.log_files)
+
+        self.set_echo_defaults(kwargs)
+        if owner.echo_metrics is not None:
+            kwargs.update(echo_ts=time())
+
+        return owner.echo_queue.put_many([(text, kwargs) for text in texts])
+
+    def restore_echo_snapshot(self, rtc, path, max_lines=0):
+        """Echo the lines kept in path to rtc, then keep its last lines there.
+
+        Restored lines skip the echo queue and log files, see EchoSnapshot.
+        """
+        import wxbreads.snapshot as wxsn
+
+        snapshot = wxsn.EchoSnapshot(path, max_lines or self.echo_snapshot_lines)
+        runs = []
+        for line_runs, suffix in snapshot.load():
+            runs.extend(line_runs)
+            if suffix:
+                runs.append(suffix)
+
+            runs.append((wxu.DEFAULT_STYLE_KEY, "\n"))
+
+        wxu.render_echo_runs(rtc, runs, False, self.echo_max_lines, self.echo_max_chars)
+        rtc.echo_snapshot = snapshot
+        self.echo_snapshots.append(snapshot)
+        return snapshot
+
+    def add_log_handler(self, logger=None, level=logging.INFO, **kwargs):
+        """Echo the records of a logger (root by default), see EchoHandler."""
+        import wxbreads.loghandler as wxlh
+
+        handler = wxlh.EchoHandler(self.add_echo_lines, level, **kwargs)
+        logging.getLogger(logger).addHandler(handler)
+        self.log_handlers.append((logger, handler))
+        return handler
+
+    def remove_log_handlers(self):
+        while self.log_handlers:
+            logger, handler = self.log_handlers.pop()
+            logging.getLogger(logger).removeHandler(handler)
+            handler.close()
+
+    def follow_file(self, path, **kwargs):
+        """Echo lines appended to path (tail -F), see FileFollower."""
+        import wxbreads.follow as wxf
+
+        follower = wxf.FileFollower(path, self.add_echo_lines, **kwargs).start()
+        self.file_followers.append(follower)
+        return follower
+
+    def stop_following(self):
+        while self.file_followers:
+            self.file_followers.pop().stop()
+
+    def run_command(self, args, **kwargs):
+        """Run a command in the background, echoing its output, see
+        CommandRunner for kwargs. Returns the started runner.
+        """
+        import wxbreads.runner as wxr
+
+        runner = wxr.CommandRunner(args, self.add_echo_lines, **kwargs).start()
+        self.command_runners = [r for r in self.command_runners if r.is_running]
+        self.command_runners.append(runner)
+        return runner
+
+    def stop_commands(self):
+        while self.command_runners:
+            self.command_runners.pop().stop()
 
     def add_echo3(self, text="", **kwargs):
         if self.clear_echo_row and kwargs.get("nl", True):
@@ -383,6 +701,64 @@ class BaseBase(object):
     def on_echoing(self, evt=None):
         wxu.on_echoing(self)
 
+    def find_echo(self, query, limit=0, partial=False):
+        """Return [(seq, text), ...] of indexed echo lines matching query."""
+        if self.echo_index is None:
+            return []
+
+        lines = []
+        for seq in self.echo_index.search(query, limit, partial):
+            text = self.echo_index.get_text(seq)
+            if text is not None:
+                lines.append((seq, text))
+
+        return lines
+
+    def show_echo_line(self, seq):
+        """Scroll the echo pane to an indexed line and select it."""
+        line_no = self.echo_index.get_pane_line(seq)
+        if line_no < 0:
+            return False
+
+        return wxu.show_echo_line(self.rtc, line_no)
+
+    def on_find_echo(self, evt=None):
+        import wxbreads.search as wxs
+
+        if self.echo_index is None:
+            return
+
+        dlg = wxs.EchoSearchDialog(parent=self, t=self.t)
+        dlg.show(modal=False)
+
+    def replay_log(self, path, speed=1.0, **kwargs):
+        """Echo the lines of a log file again in a thread, see LogReplay."""
+        import wxbreads.replay as wxr
+
+        return wxr.LogReplay(path, self.add_echo, speed, **kwargs).start()
+
+    def view_log_file(self, path, **kwargs):
+        """Open a (big) echo log file in a paged, memory-mapped viewer."""
+        import wxbreads.logview as wxlv
+
+        dlg = wxlv.LogFileDialog(path, parent=self, t=self.t, **kwargs)
+        dlg.show(modal=False)
+        return dlg
+
+    def on_echo_key(self, evt):
+        if evt.ControlDown() and evt.GetKeyCode() == ord("F"):
+            self.on_find_echo()
+        else:
+            evt.Skip()
+
+    def wake_echoing(self):
+        """Called from any thread by the first add_echo after idle."""
+        wx.CallAfter(self.on_echo_wakeup)
+
+    def on_echo_wakeup(self):
+        if self:  # window may be destroyed before the call arrives
+            self.on_echoing()
+
     def create_menu_item(
         self,
         parent=None,
@@ -467,6 +843,9 @@ class BaseWindow(wx.Frame, BaseBase):
     reset_copyright = True
     reset_copyright_seconds = (0, 1, 30, 31)
     sbar_width = [260, -1, 130]
+    echo_status_width = 0  # >0 adds an echo metrics field to the status bar
+    virtual_echo = False  # use LogView instead of RichTextCtrl for echo
+    virtual_echo_lines = 500000
 
     def __init__(self, **kwargs):
         self.init_values(**kwargs)
@@ -534,13 +913,41 @@ class BaseWindow(wx.Frame, BaseBase):
         vbox = wx.BoxSizer(wx.VERTICAL)
         self.fill_main_page(p, vbox, **kwargs)
 
-        self.rtc = wxw.add_richtext(p, readonly=True, size=(-1, 450))
+        if self.virtual_echo:
+            self.rtc = wxw.add_logview(
+                p, max_lines=self.virtual_echo_lines, size=(-1, 450)
+            )
+        else:
+            self.rtc = wxw.add_richtext(p, readonly=True, size=(-1, 450))
+
+        if self.echo_index is not None:
+            self.rtc.Bind(wx.EVT_KEY_DOWN, self.on_echo_key)
 
         wxw.pack(self.rtc, vbox, prop=1, flag="e,a")
+        if self.echo_snapshot_file:
+            self.restore_echo_snapshot(self.rtc, self.echo_snapshot_file)
 
         self.base_layout(p, vbox)
         self.book.AddPage(p, self.tt(title))
 
+    def add_echo_page(self, channel, title=None, **kwargs):
+        """Add a notebook page echoing the lines of channel, see
+        add_echo_channel for kwargs.
+        """
+        p = wx.Panel(self.book)
+        vbox = wx.BoxSizer(wx.VERTICAL)
+        if kwargs.pop("virtual", self.virtual_echo):
+            max_lines = kwargs.pop("max_lines", 0) or self.virtual_echo_lines
+            rtc = wxw.add_logview(p, max_lines=max_lines)
+        else:
+            rtc = wxw.add_richtext(p, readonly=True)
+
+        wxw.pack(rtc, vbox, prop=1, flag="e,a")
+        self.base_layout(p, vbox)
+        self.book.AddPage(p, self.tt(title or channel))
+        self.add_echo_channel(channel, rtc, **kwargs)
+        return rtc
+
     def add_base_settings_page(self, title="Settings", **kwargs):
         self.is_locked = True
         p = wx.Panel(self.book)
@@ -591,7 +998,8 @@ class BaseWindow(wx.Frame, BaseBase):
     def enable_wgts(self, enable=True, wgts=[]):
         [wgt.Enable(enable) for wgt in wgts or self.setting_wgts]
 
-    def setup_timers(self, clock_ms=1000, echo_ms=200):
+    def setup_timers(self, clock_ms=1000, echo_ms=0):
+        """Without echo_ms, queued echo lines wake up the GUI thread."""
         self.all_timers = []
         if clock_ms:
             self.clock_timer = wxw.add_timer(
@@ -600,11 +1008,14 @@ class BaseWindow(wx.Frame, BaseBase):
             self.all_timers.append(self.clock_timer)
 
         if echo_ms:
+            self.echo_idle_ms = self.echo_interval = echo_ms
             self.echo_timer = wxw.add_timer(
                 self, self.echo_timer_id, self.on_echoing, echo_ms
             )
 
             self.all_timers.append(self.echo_timer)
+        else:
+            self.echo_queue.set_wakeup(self.wake_echoing)
 
     def stop_timers(self, delete=False):
         if hasattr(self, "all_timers"):
@@ -617,6 +1028,13 @@ class BaseWindow(wx.Frame, BaseBase):
                 if datetime.now().second in self.reset_copyright_seconds:
                     self.update_status(self.get_copyright(), 0, t=None)
 
+            if getattr(self, "echo_sb_idx", None) is not None:
+                text = wxu.format_echo_metrics(self.get_echo_metrics())
+                self.update_status(text, self.echo_sb_idx, t=None)
+
+        self.flush_echo_repeats(expired_only=True)
+        self.log_sinks.maybe_flush()
+        [snapshot.maybe_flush() for snapshot in self.echo_snapshots]
         self.other_clock_work()
 
     def update_run_ts(self, idx=1, as_seconds=True):
@@ -629,10 +1047,16 @@ class BaseWindow(wx.Frame, BaseBase):
 
     def setup_statusbar(self):
         self.has_sbar = True
-        self.sb_count = len(self.get_sb_width())
-        self.sbar = wxw.add_statusbar(
-            self, widths=self.get_sb_width(), values=self.get_sb_value()
-        )
+        widths = list(self.get_sb_width())
+        values = list(self.get_sb_value())
+        self.echo_sb_idx = None
+        if self.echo_status_width:  # just before the clock
+            self.echo_sb_idx = len(widths) - 1
+            widths.insert(self.echo_sb_idx, self.echo_status_width)
+            values.insert(self.echo_sb_idx, "")
+
+        self.sb_count = len(widths)
+        self.sbar = wxw.add_statusbar(self, widths=widths, values=values)
         self.SetStatusBar(self.sbar)
 
     def get_sb_width(self):
@@ -677,6 +1101,7 @@ class BaseWindow(wx.Frame, BaseBase):
             zh=self.get_zh_mo(),
             en=self.get_en_mo(),
         )
+        wxu.TRANSLATIONS.clear()
 
     def refresh_translation(self, wgts=[]):
         font = self.auto_font()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from time import time
+
+import wx
+
+import wxbreads.echo as wxe
+import wxbreads.utils as wxu
+
+
+class EchoChannel(object):
+    """Named echo stream with its own pane, queue, budget and log files.
+
+    Each channel drains its queue in its own wakeups (at most budget_ms
+    each), so a noisy channel never holds back the rendering of others.
+    """
+
+    def __init__(self, name, rtc, **kwargs):
+        self.name = name
+        self.rtc = rtc
+        self.echo_queue = wxe.EchoQueue(
+            kwargs.get("capacity", 0),
+            kwargs.get("overflow", "drop_oldest"),
+            on_drop=wxu.log_dropped_echo,
+        )
+        self.echo_lines = self.echo_queue  # for utils.on_echoing
+        self.echo_budget_ms = kwargs.get("budget_ms", 40)
+        self.echo_busy_ms = kwargs.get("busy_ms", 10)
+        self.echo_max_lines = kwargs.get("max_lines", 0)
+        self.echo_max_chars = kwargs.get("max_chars", 0)
+        self.log_files = list(kwargs.get("log_files", []))
+        self.echo_index = None
+        self.echo_metrics = wxe.EchoMetrics() if kwargs.get("metrics", True) else None
+        self.is_echoing = False
+        self.echo_line_cost = 0
+        self.echo_queue.set_wakeup(self.wake_echoing)
+
+    def add(self, text, kwargs):
+        kwargs.setdefault("log_files", self.log_files)
+        if self.echo_metrics is not None:
+            kwargs.update(echo_ts=time())
+
+        return self.echo_queue.put((text, kwargs))
+
+    def wake_echoing(self):
+        wx.CallAfter(self.on_echo_wakeup)
+
+    def on_echo_wakeup(self):
+        if self.rtc:  # pane may be destroyed before the call arrives
+            wxu.on_echoing(self)
+
+    def get_metrics(self):
+        metrics = dict(
+            queue_depth=len(self.echo_queue), dropped=self.echo_queue.dropped
+        )
+        if self.echo_metrics is not None:
+            metrics.update(self.echo_metrics.snapshot())
+
+        return metrics
+
+    def close(self):
+        self.echo_queue.set_wakeup(None)
+        self.echo_queue.clear()
@@ -0,0 +1,713 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, unicode_literals
+
+import codecs
+import re
+import threading
+from bisect import bisect_left
+from collections import deque
+from time import time
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest", "coalesce")
+MAX_INTERNED_SPANS = 4096
+# bookkeeping kwargs of queued lines, not part of their style
+MERGE_IGNORED_KEYS = (
+    "echo_seq",
+    "echo_repeat",
+    "echo_repeat_from",
+    "echo_repeat_log",
+    "echo_ts",
+)
+REPEAT_FORMAT = " \u00d7 {}"
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def in_main_thread():
+    return threading.current_thread().name == "MainThread"
+
+
+def get_style_kwargs(kwargs):
+    return dict((k, v) for k, v in kwargs.items() if k not in MERGE_IGNORED_KEYS)
+
+
+def coalesce_lines(old, new):
+    """Merge two queued echo lines, or return None if they differ in style."""
+    text, kwargs = old
+    new_text, new_kwargs = new
+    if get_style_kwargs(kwargs) != get_style_kwargs(new_kwargs):
+        return None
+
+    if not kwargs.get("nl", True):
+        return None
+
+    if "echo_repeat" in kwargs or "echo_repeat" in new_kwargs:
+        return None
+
+    if kwargs.get("args") or kwargs.get("kargs"):
+        return None
+
+    return ("{}\n{}".format(text, new_text), kwargs)
+
+
+ANSI_RE = re.compile(
+    "\x1b(?:\\[([0-9;?]*)([@-~])|\\][^\x07\x1b]*(?:\x07|\x1b\\\\)|[@-Z\\\\-_])"
+)
+ANSI_PARTIAL_RE = re.compile("\x1b(?:\\[[0-9;?]*|\\][^\x07\x1b]*)?$")
+ANSI_COLORS = (
+    "#000000",
+    "#CD0000",
+    "#00CD00",
+    "#CDCD00",
+    "#0000EE",
+    "#CD00CD",
+    "#00CDCD",
+    "#E5E5E5",
+    "#7F7F7F",
+    "#FF0000",
+    "#00FF00",
+    "#FFFF00",
+    "#5C5CFF",
+    "#FF00FF",
+    "#00FFFF",
+    "#FFFFFF",
+)
+ANSI_LEVELS = (0, 95, 135, 175, 215, 255)
+MAX_ANSI_PENDING = 4096  # longer unterminated escape sequences are text
+
+
+def get_ansi_color(n):
+    """Hex colour of a 256 colour palette index."""
+    if n < 16:
+        return ANSI_COLORS[n]
+
+    if n >= 232:
+        level = 8 + (n - 232) * 10
+        return "#{0:02X}{0:02X}{0:02X}".format(level)
+
+    n -= 16
+    rgb = (ANSI_LEVELS[n // 36], ANSI_LEVELS[n // 6 % 6], ANSI_LEVELS[n % 6])
+    return "#{:02X}{:02X}{:02X}".format(*rgb)
+
+
+def strip_ansi(text):
+    return ANSI_RE.sub("", text) if "\x1b" in text else text
+
+
+class AnsiParser(object):
+    """Streaming parser of ANSI escape sequences.
+
+    feed() returns [(style, text), ...] segments, style being None or a
+    (fg, bg, bold, italic, underline) tuple, SGR state carries over between
+    feeds and an escape sequence cut at the end of a feed is completed by
+    the next one. Other sequences (cursor moves, titles...) are dropped.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.fg = self.bg = None
+        self.bold = self.italic = self.underline = self.inverse = False
+        self.style = None
+        self.pending = ""
+
+    def get_style(self):
+        fg, bg = (self.bg, self.fg) if self.inverse else (self.fg, self.bg)
+        if self.inverse:
+            fg, bg = fg or "#FFFFFF", bg or "#000000"
+
+        style = (fg, bg, self.bold, self.italic, self.underline)
+        return None if style == (None, None, False, False, False) else style
+
+    def set_sgr(self, params):
+        codes = [int(p) if p.isdigit() else 0 for p in params.split(";")]
+        i = 0
+        while i < len(codes):
+            code = codes[i]
+            if code == 0:
+                self.reset_sgr()
+            elif code == 1:
+                self.bold = True
+            elif code == 22:
+                self.bold = False
+            elif code in (3, 23):
+                self.italic = code == 3
+            elif code in (4, 24):
+                self.underline = code == 4
+            elif code in (7, 27):
+                self.inverse = code == 7
+            elif 30 <= code <= 37 or 90 <= code <= 97:
+                self.fg = ANSI_COLORS[code - 30 if code < 90 else code - 82]
+            elif 40 <= code <= 47 or 100 <= code <= 107:
+                self.bg = ANSI_COLORS[code - 40 if code < 100 else code - 92]
+            elif code in (39, 49):
+                setattr(self, "fg" if code == 39 else "bg", None)
+            elif code in (38, 48) and i + 1 < len(codes):
+                color = None
+                if codes[i + 1] == 5 and i + 2 < len(codes):
+                    color = get_ansi_color(codes[i + 2] % 256)
+                    i += 2
+                elif codes[i + 1] == 2 and i + 4 < len(codes):
+                    rgb = [min(c, 255) for c in codes[i + 2 : i + 5]]
+                    color = "#{:02X}{:02X}{:02X}".format(*rgb)
+                    i += 4
+
+                setattr(self, "fg" if code == 38 else "bg", color)
+
+            i += 1
+
+        self.style = self.get_style()
+
+    def reset_sgr(self):
+        self.fg = self.bg = None
+        self.bold = self.italic = self.underline = self.inverse = False
+
+    def feed(self, text):
+        if self.pending:
+            text, self.pending = self.pending + text, ""
+
+        if "\x1b" not in text:
+            return [(self.style, text)] if text else []
+
+        m = ANSI_PARTIAL_RE.search(text)
+        if m and len(text) - m.start() <= MAX_ANSI_PENDING:
+            text, self.pending = text[: m.start()], text[m.start() :]
+
+        segments = []
+        pos = 0
+        for m in ANSI_RE.finditer(text):
+            if m.start() > pos:
+                segments.append((self.style, text[pos : m.start()]))
+
+            if m.group(2) == "m":
+                self.set_sgr(m.group(1))
+
+            pos = m.end()
+
+        if pos < len(text):
+            segments.append((self.style, text[pos:]))
+
+        return segments
+
+
+class LineDecoder(object):
+    """Decode a byte stream chunk by chunk into complete text lines.
+
+    Multi-byte characters split across chunks are kept for the next chunk,
+    an unterminated line is returned once it reaches max_partial chars.
+    """
+
+    def __init__(self, encoding="utf-8", max_partial=64 * 1024):
+        self.encoding = encoding
+        self.max_partial = max_partial
+        self.reset()
+
+    def reset(self):
+        self.decoder = codecs.getincrementaldecoder(self.encoding)("replace")
+        self.partial = ""
+
+    def feed(self, data, final=False):
+        lines = (self.partial + self.decoder.decode(data, final)).split("\n")
+        self.partial = lines.pop()
+        lines = [line.rstrip("\r") for line in lines]
+        if len(self.partial) >= self.max_partial or (final and self.partial):
+            lines.append(self.partial)
+            self.partial = ""
+
+        return lines
+
+
+class EchoQueue(object):
+    """Bounded FIFO of (text, kwargs) echo lines.
+
+    capacity: max queued lines, 0 means unbounded
+    policy: what happens to a new line when the queue is full
+        block: producer waits for room (never on the GUI thread)
+        drop_oldest: discard the oldest queued line
+        drop_newest: discard the new line
+        coalesce: merge the new line into the newest queued one
+    wakeup: called (from the producer thread) by the first put after the
+        consumer called end_drain() on an empty queue
+    on_drop: called (from the producer thread) with every dropped line,
+        e.g. to still write it to its log files
+    """
+
+    def __init__(self, capacity=0, policy="drop_oldest", merge=None, on_drop=None):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError("unknown overflow policy: {}".format(policy))
+
+        self.capacity = max(int(capacity or 0), 0)
+        self.policy = policy
+        self.merge = merge or coalesce_lines
+        self.on_drop = on_drop
+        self.dropped = 0
+        self.lines = deque()
+        # reentrant, so a producer can hold it around a check and a put
+        self.not_full = threading.Condition(threading.RLock())
+        self.wakeup = None
+        self.scheduled = False
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    __nonzero__ = __bool__
+
+    def is_full(self):
+        return self.capacity and len(self.lines) >= self.capacity
+
+    def put(self, item, block=True, timeout=None):
+        """Queue a line, return False if it was dropped."""
+        queued = self._put(item, block, timeout)
+        if queued:
+            self.wake()
+
+        return queued
+
+    def put_many(self, items, block=True, timeout=None):
+        """Queue lines with a single wakeup, return how many were queued."""
+        queued = sum(self._put(item, block, timeout) for item in items)
+        if queued:
+            self.wake()
+
+        return queued
+
+    def wake(self):
+        if self.wakeup and not self.scheduled:
+            with self.not_full:
+                wake = not self.scheduled
+                self.scheduled = True
+
+            if wake:
+                self.wakeup()
+
+    def _put(self, item, block=True, timeout=None):
+        with self.not_full:
+            queued, dropped = self._add(item, block, timeout)
+
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)  # out of the lock, it may write files
+
+        return queued
+
+    def _add(self, item, block=True, timeout=None):
+        """Queue item, return (queued, the line dropped or None)."""
+        dropped = None
+        if self.is_full():
+            if self.policy == "block" and block and not in_main_thread():
+                end = None if timeout is None else time() + timeout
+                while self.is_full():
+                    remaining = None if end is None else end - time()
+                    if remaining is not None and remaining <= 0:
+                        self.dropped += 1
+                        return False, item
+
+                    self.not_full.wait(remaining)
+
+            elif self.policy == "drop_oldest":
+                dropped = self.lines.popleft()
+                self.dropped += 1
+            elif self.policy == "coalesce":
+                merged = self.merge(self.lines[-1], item)
+                if merged is not None:
+                    self.lines[-1] = merged
+                    return True, None
+
+                dropped = self.lines.popleft()
+                self.dropped += 1
+            else:
+                self.dropped += 1
+                return False, item
+
+        self.lines.append(item)
+        return True, dropped
+
+    append = put
+
+    def get(self):
+        """Pop the oldest line, raise IndexError when empty."""
+        with self.not_full:
+            item = self.lines.popleft()
+            self.not_full.notify()
+            return item
+
+    popleft = get
+
+    def get_many(self, count):
+        with self.not_full:
+            items = []
+            while self.lines and len(items) < count:
+                items.append(self.lines.popleft())
+
+            self.not_full.notify_all()
+            return items
+
+    def put_repeat(self, item):
+        """Queue a repeat counter update, replacing a queued one if any."""
+        with self.not_full:
+            if self.lines:
+                tail = self.lines[-1][1]
+                if tail.get("echo_repeat") and not tail.get("no_echo"):
+                    item[1]["echo_repeat_from"] = tail["echo_repeat_from"]
+                    self.lines[-1] = item
+                    return True
+
+        return self.put(item)
+
+    def set_wakeup(self, wakeup=None):
+        with self.not_full:
+            self.wakeup = wakeup
+            self.scheduled = bool(wakeup and self.lines)
+
+        if self.scheduled:
+            wakeup()
+
+    def end_drain(self):
+        """Tell the queue a drain finished, return True if lines are left."""
+        with self.not_full:
+            if self.lines:
+                return True
+
+            self.scheduled = False
+            return False
+
+    def clear(self):
+        with self.not_full:
+            self.lines.clear()
+            self.not_full.notify_all()
+
+    def reset_dropped(self):
+        with self.not_full:
+            dropped, self.dropped = self.dropped, 0
+            return dropped
+
+
+class EchoRing(object):
+    """Fixed size history of styled echo lines.
+
+    Runs of (style_key, text) are split into lines, each stored as
+    (text, spans) where spans is an interned tuple of (offset, style_key)
+    pairs, so lines with the same layout share one spans object.
+    """
+
+    def __init__(self, max_lines=100000):
+        self.lines = deque(maxlen=max_lines or None)
+        self.spans = {}
+        self.pending = []  # runs of the unfinished last line
+        self.first = 0  # number of the oldest kept line
+        self.suffix_len = 0  # length of the repeat suffix of the last line
+
+    def __len__(self):
+        return len(self.lines) + (1 if self.pending else 0)
+
+    def intern_spans(self, spans):
+        spans = tuple(spans)
+        if len(self.spans) < MAX_INTERNED_SPANS:
+            return self.spans.setdefault(spans, spans)
+
+        return self.spans.get(spans, spans)
+
+    def add_line(self, runs):
+        texts = []
+        spans = []
+        offset = 0
+        for key, text in runs:
+            if not text:
+                continue
+
+            if not spans or spans[-1][1] != key:
+                spans.append((offset, key))
+
+            texts.append(text)
+            offset += len(text)
+
+        if self.lines.maxlen and len(self.lines) == self.lines.maxlen:
+            self.first += 1
+
+        self.lines.append(("".join(texts), self.intern_spans(spans)))
+        self.suffix_len = 0
+
+    def set_suffix(self, key, suffix):
+        """Replace the trailing suffix (repeat counter) of the last line."""
+        if not self.lines or self.pending:
+            return
+
+        text, spans = self.lines[-1]
+        if self.suffix_len:
+            text = text[: -self.suffix_len]
+            spans = spans[:-1]
+
+        spans = self.intern_spans(tuple(spans) + ((len(text), key),))
+        self.lines[-1] = (text + suffix, spans)
+        self.suffix_len = len(suffix)
+
+    def add_runs(self, runs):
+        for key, text in runs:
+            while "\n" in text:
+                head, text = text.split("\n", 1)
+                self.pending.append((key, head))
+                self.add_line(self.pending)
+                self.pending = []
+
+            if text:
+                self.pending.append((key, text))
+
+    def get_record(self, index):
+        if index == len(self.lines) and self.pending:
+            text = "".join(t for _, t in self.pending)
+            offsets = []
+            offset = 0
+            for key, t in self.pending:
+                offsets.append((offset, key))
+                offset += len(t)
+
+            return text, offsets
+
+        return self.lines[index]
+
+    def get_runs(self, index):
+        text, spans = self.get_record(index)
+        ends = [offset for offset, _ in spans[1:]] + [len(text)]
+        return [(key, text[o:end]) for (o, key), end in zip(spans, ends)]
+
+    def get_text(self, index):
+        return self.get_record(index)[0]
+
+    def clear(self):
+        self.first += len(self.lines)
+        self.lines.clear()
+        self.pending = []
+
+
+class EchoRepeats(object):
+    """Count identical consecutive echo lines within `window` seconds."""
+
+    def __init__(self, window=5.0):
+        self.window = window
+        self.text = None
+        self.style = None
+        self.since = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def check(self, text, kwargs):
+        """Return (times seen in a row, (text, style, count) of ended run).
+
+        The ended run is only returned if it had repeats. Lines without
+        newline (nl=False) are never counted, their suffix would land on
+        another line.
+        """
+        if not kwargs.get("nl", True):
+            return 1, self.end()
+
+        style = get_style_kwargs(kwargs)
+        now = time()
+        with self.lock:
+            if (
+                text == self.text
+                and style == self.style
+                and now - self.since <= self.window
+            ):
+                self.count += 1
+                return self.count, None
+
+            ended = None
+            if self.count > 1:
+                ended = (self.text, self.style, self.count)
+
+            self.text, self.style, self.since, self.count = text, style, now, 1
+            return 1, ended
+
+    def end(self, expired_only=False):
+        """End the current run, return its (text, style, count) if it had
+        repeats. expired_only: only once its window is over.
+        """
+        with self.lock:
+            if expired_only and time() - self.since <= self.window:
+                return None
+
+            ended = None
+            if self.count > 1:
+                ended = (self.text, self.style, self.count)
+
+            self.text, self.style, self.count = None, None, 0
+            return ended
+
+
+def get_percentile(values, pct):
+    """pct (0-100) percentile of already sorted values, 0 if none."""
+    if not values:
+        return 0
+
+    return values[min(int(len(values) * pct / 100), len(values) - 1)]
+
+
+class EchoMetrics(object):
+    """Counters of the echo pipeline, fed by the GUI thread.
+
+    lags: seconds from add_echo (kwargs echo_ts) to render, last `samples`
+    ticks: seconds spent rendering per timer tick/wakeup, last `samples`
+    """
+
+    def __init__(self, samples=2048):
+        self.lags = deque(maxlen=samples)
+        self.ticks = deque(maxlen=samples)
+        self.rendered = 0
+        self.rate = 0.0  # lines rendered per second
+        self.rate_since = time()
+        self.rate_count = 0
+
+    def add_rendered(self, lines):
+        now = time()
+        for _, kwargs in lines:
+            ts = kwargs.get("echo_ts")
+            if ts:
+                self.lags.append(now - ts)
+
+        self.rendered += len(lines)
+        self.rate_count += len(lines)
+        if now - self.rate_since >= 1:
+            self.rate = self.rate_count / (now - self.rate_since)
+            self.rate_since, self.rate_count = now, 0
+
+    def add_tick(self, seconds):
+        self.ticks.append(seconds)
+
+    def get_rate(self):
+        elapsed = time() - self.rate_since
+        if elapsed >= 2:  # nothing rendered lately
+            return self.rate_count / elapsed
+
+        return self.rate
+
+    def snapshot(self):
+        lags = sorted(self.lags)
+        ticks = list(self.ticks)
+        return dict(
+            rendered=self.rendered,
+            lines_per_sec=self.get_rate(),
+            lag_p50_ms=get_percentile(lags, 50) * 1000,
+            lag_p90_ms=get_percentile(lags, 90) * 1000,
+            lag_p99_ms=get_percentile(lags, 99) * 1000,
+            lag_max_ms=(lags[-1] if lags else 0) * 1000,
+            render_ms=(ticks[-1] if ticks else 0) * 1000,
+            render_avg_ms=(sum(ticks) / len(ticks) if ticks else 0) * 1000,
+            render_max_ms=(max(ticks) if ticks else 0) * 1000,
+        )
+
+
+def tokenize(text):
+    return set(TOKEN_RE.findall(text.lower()))
+
+
+def contains_seq(posting, seq):
+    i = bisect_left(posting, seq)
+    return i < len(posting) and posting[i] == seq
+
+
+class EchoIndex(object):
+    """Incremental inverted index (token -> sorted line numbers) of echo lines.
+
+    Lines get increasing numbers (seq) when added, only the last max_lines
+    are kept. pane_lines maps a seq to the absolute line of the echo pane
+    it was rendered on, -1 until it is rendered.
+    """
+
+    def __init__(self, max_lines=100000):
+        self.max_lines = max_lines
+        self.texts = deque()
+        self.pane_lines = deque()
+        self.postings = {}
+        self.first = 0  # seq of the oldest kept line
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, text):
+        with self.lock:
+            seq = self.first + len(self.texts)
+            self.texts.append(text)
+            self.pane_lines.append(-1)
+            for token in tokenize(text):
+                posting = self.postings.get(token)
+                if posting is None:
+                    self.postings[token] = [seq]
+                else:
+                    posting.append(seq)
+
+            if self.max_lines and len(self.texts) > self.max_lines:
+                self.evict()
+
+            return seq
+
+    def evict(self):
+        text = self.texts.popleft()
+        self.pane_lines.popleft()
+        self.first += 1
+        for token in tokenize(text):
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+
+            if posting[-1] < self.first:
+                del self.postings[token]
+            else:
+                dead = bisect_left(posting, self.first)
+                if dead * 2 > len(posting):  # compact once half is stale
+                    del posting[:dead]
+
+    def get_postings(self, token, partial=False):
+        posting = self.postings.get(token)
+        if posting is not None or not partial:
+            return posting or []
+
+        seqs = set()
+        for key, posting in self.postings.items():
+            if token in key:
+                seqs.update(posting)
+
+        return sorted(seqs)
+
+    def search(self, query, limit=0, partial=False):
+        """Seqs of lines containing all words of query, oldest first.
+
+        partial: also match words containing a query word (slower)
+        limit: only return the newest `limit` matches
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self.lock:
+            postings = sorted(
+                (self.get_postings(token, partial) for token in tokens), key=len
+            )
+            seqs = postings[0][bisect_left(postings[0], self.first) :]
+            for posting in postings[1:]:
+                seqs = [seq for seq in seqs if contains_seq(posting, seq)]
+
+        return seqs[-limit:] if limit else seqs
+
+    def get_text(self, seq):
+        with self.lock:
+            if seq < self.first:
+                return None
+
+            return self.texts[seq - self.first]
+
+    def set_pane_line(self, seq, line_no):
+        with self.lock:
+            if self.first <= seq < self.first + len(self.pane_lines):
+                self.pane_lines[seq - self.first] = line_no
+
+    def get_pane_line(self, seq):
+        with self.lock:
+            if self.first <= seq < self.first + len(self.pane_lines):
+                return self.pane_lines[seq - self.first]
+
+            return -1
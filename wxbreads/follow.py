@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import os
+import threading
+
+import wxbreads.echo as wxe
+
+READ_SIZE = 1024 * 1024
+
+
+class FileFollower(object):
+    """Echo the lines appended to a file, like tail -F, from a thread.
+
+    Only bytes after the last read offset are read, in READ_SIZE chunks,
+    and every chunk is echoed as one batch by echo_lines(texts, **kwargs),
+    normally BaseBase.add_echo_lines. A truncated file is read again from
+    the start, a rotated (replaced) file is drained and then followed anew.
+
+    interval: seconds between checks for new data
+    from_end: skip the data already in the file when starting
+    kwargs: passed to echo_lines (channel, style, ts...)
+    """
+
+    def __init__(self, path, echo_lines, interval=0.5, from_end=True, **kwargs):
+        self.path = path
+        self.echo_lines = echo_lines
+        self.interval = interval
+        self.from_end = from_end
+        self.decoder = wxe.LineDecoder(kwargs.pop("encoding", "utf-8"))
+        self.echo_kwargs = kwargs
+        self.handle = None
+        self.file_id = None
+        self.offset = 0
+        self.lines = 0
+        self.first_check = True  # from_end only applies to the file seen first
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="FileFollower")
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self.stop_event.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+    def open(self, at_end=False):
+        try:
+            handle = open(self.path, "rb")
+        except (IOError, OSError):
+            return False
+
+        st = os.fstat(handle.fileno())
+        self.close()
+        self.handle = handle
+        self.file_id = (st.st_ino, st.st_dev)
+        self.offset = st.st_size if at_end else 0
+        self.handle.seek(self.offset)
+        self.decoder.reset()
+        return True
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+    def read_new(self):
+        """Echo everything appended since the last read."""
+        while not self.stop_event.is_set():
+            data = self.handle.read(READ_SIZE)
+            if not data:
+                break
+
+            self.offset += len(data)
+            self.echo(self.decoder.feed(data))
+
+    def echo(self, lines):
+        if lines:
+            self.lines += len(lines)
+            self.echo_lines(lines, **dict(self.echo_kwargs))
+
+    def check(self):
+        if self.handle is None:
+            at_end = self.from_end and self.first_check
+            self.first_check = False
+            if self.open(at_end):
+                self.read_new()
+
+            return
+
+        try:
+            st = os.stat(self.path)
+        except OSError:  # being rotated, keep the old file
+            return self.read_new()
+
+        if self.file_id[0] and (st.st_ino, st.st_dev) != self.file_id:
+            self.read_new()  # rest of the rotated file
+            self.echo(self.decoder.feed(b"", final=True))
+            if self.open():
+                self.read_new()
+        elif st.st_size < self.offset:  # truncated
+            self.echo(self.decoder.feed(b"", final=True))
+            self.handle.seek(0)
+            self.offset = 0
+            self.decoder.reset()
+            self.read_new()
+        elif st.st_size > self.offset:
+            self.read_new()
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                self.check()
+                self.stop_event.wait(self.interval)
+
+            if self.handle is not None:
+                self.echo(self.decoder.feed(b"", final=True))
+        finally:
+            self.close()
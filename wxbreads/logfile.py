@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, unicode_literals
+
+import mmap
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+BLOCK_SIZE = 64 * 1024
+TS_RE = re.compile(b"^\\[([0-9-]{10} [0-9:]{8})(?:\\.([0-9]+))?\\] ")
+TS_SCAN_LINES = 50  # lines looked at to find a timestamp near a line
+
+
+def split_echo_ts(line):
+    """Split a log line (bytes) into the datetime of its
+    [YYYY-MM-DD HH:MM:SS.ffffff] prefix (or None) and the rest.
+    """
+    m = TS_RE.match(line)
+    if not m:
+        return None, line
+
+    try:
+        ts = datetime.strptime(m.group(1).decode("ascii"), "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None, line
+
+    if m.group(2):
+        ts = ts.replace(microsecond=int(m.group(2)[:6].ljust(6, b"0")))
+
+    return ts, line[m.end() :]
+
+
+def parse_echo_ts(line):
+    return split_echo_ts(line)[0]
+
+
+def parse_jump_target(text):
+    """Line number (1 based in text, 0 based returned) or datetime, or None."""
+    text = text.strip()
+    if text.isdigit():
+        return max(int(text) - 1, 0)
+
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text.split(".")[0], fmt)
+        except ValueError:
+            pass
+
+    return None
+
+
+class LogFileIndex(object):
+    """Memory-mapped log file with a sparse line index.
+
+    A background thread counts the newlines of every BLOCK_SIZE block, so
+    the start of any line is found by a bisect and a scan of one block,
+    without keeping an offset per line.
+    """
+
+    def __init__(self, path, encoding="utf-8"):
+        self.path = path
+        self.encoding = encoding
+        self.file = open(path, "rb")
+        self.file.seek(0, 2)
+        self.size = self.file.tell()
+        self.mm = None
+        if self.size:
+            self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # newlines before each block start, one more entry than indexed blocks
+        self.newlines = array(str("l"), [0])
+        self.done = not self.size
+        self.stopped = False
+        self.thread = None
+
+    def start(self):
+        if self.thread is None and not self.done:
+            self.thread = threading.Thread(target=self.build, name="LogFileIndex")
+            self.thread.daemon = True
+            self.thread.start()
+
+        return self
+
+    def build(self):
+        count = 0
+        for start in range(0, self.size, BLOCK_SIZE):
+            if self.stopped:
+                return
+
+            count += self.mm[start : start + BLOCK_SIZE].count(b"\n")
+            self.newlines.append(count)
+
+        self.done = True
+
+    @property
+    def progress(self):
+        if self.done:
+            return 1.0
+
+        return (len(self.newlines) - 1) * BLOCK_SIZE / self.size
+
+    def get_line_count(self):
+        """Lines indexed so far (all lines once done)."""
+        count = self.newlines[-1]
+        if self.done and self.size and self.mm[self.size - 1 : self.size] != b"\n":
+            count += 1  # last line without newline
+
+        return count
+
+    def get_offset(self, line_no):
+        """Byte offset where line_no (0 based) starts, None if not indexed."""
+        if line_no <= 0:
+            return 0 if line_no == 0 and self.size else None
+
+        newlines = self.newlines
+        block = bisect_left(newlines, line_no) - 1  # newline line_no is in it
+        if block + 1 >= len(newlines):
+            return None
+
+        pos = block * BLOCK_SIZE
+        for _ in range(line_no - newlines[block]):
+            pos = self.mm.find(b"\n", pos) + 1
+
+        return pos if pos < self.size else None
+
+    def get_raw_line(self, line_no):
+        start = self.get_offset(line_no)
+        if start is None:
+            return None
+
+        end = self.mm.find(b"\n", start)
+        line = self.mm[start : end if end >= 0 else self.size]
+        return line[:-1] if line.endswith(b"\r") else line
+
+    def get_line(self, line_no):
+        line = self.get_raw_line(line_no)
+        if line is None:
+            return None
+
+        return line.decode(self.encoding, "replace")
+
+    def get_lines(self, first, count):
+        """Decode count lines from first, scanning the file only once."""
+        start = self.get_offset(first)
+        lines = []
+        while start is not None and start < self.size and len(lines) < count:
+            end = self.mm.find(b"\n", start)
+            if end < 0:
+                end = self.size
+
+            line = self.mm[start:end]
+            lines.append(line.rstrip(b"\r").decode(self.encoding, "replace"))
+            start = end + 1
+
+        return lines
+
+    def get_line_ts(self, line_no):
+        """Timestamp of line_no, or of the nearest line before it with one."""
+        for n in range(line_no, max(line_no - TS_SCAN_LINES, -1), -1):
+            line = self.get_raw_line(n)
+            ts = parse_echo_ts(line) if line else None
+            if ts is not None:
+                return ts
+
+        return None
+
+    def find_ts(self, ts):
+        """First line logged at or after ts (a datetime), by bisection."""
+        lo, hi = 0, self.get_line_count()
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_ts = self.get_line_ts(mid)
+            if mid_ts is not None and mid_ts < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
+
+    def close(self):
+        self.stopped = True
+        if self.thread is not None:
+            self.thread.join()
+
+        if self.mm is not None:
+            self.mm.close()
+
+        self.file.close()
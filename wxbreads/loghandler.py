@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import logging
+import sys
+import threading
+import traceback
+from collections import deque
+
+LEVEL_STYLES = {
+    logging.DEBUG: dict(fg="grey"),
+    logging.INFO: {},
+    logging.WARNING: dict(fg="#C87800"),
+    logging.ERROR: dict(fg="red"),
+    logging.CRITICAL: dict(fg="red", bold=True),
+}
+DEFAULT_FORMAT = "%(levelname)s %(name)s: %(message)s"
+
+
+class EchoHandler(logging.Handler):
+    """logging handler echoing records in batches from its own thread.
+
+    emit() only formats and buffers the record, a flusher thread (idle
+    while nothing is buffered) hands the lines buffered within
+    flush_interval seconds to echo_lines(texts, style=...) (normally
+    BaseBase.add_echo_lines), one call per run of records with the same
+    style.
+
+    styles: levelno -> echo style name or kwargs, the closest lower mapped
+        level is used for other levels
+    capacity: max buffered records, then records below keep_level are
+        dropped first (counted in dropped and reported in the pane)
+    kwargs: passed to echo_lines (channel, ts...)
+    """
+
+    def __init__(self, echo_lines, level=logging.NOTSET, **kwargs):
+        super(EchoHandler, self).__init__(level)
+        self.echo_lines = echo_lines
+        self.styles = dict(LEVEL_STYLES)
+        self.styles.update(kwargs.pop("styles", {}))
+        self.flush_interval = kwargs.pop("flush_interval", 0.1)
+        self.capacity = kwargs.pop("capacity", 10000)
+        self.keep_level = kwargs.pop("keep_level", logging.WARNING)
+        self.setFormatter(logging.Formatter(kwargs.pop("fmt", DEFAULT_FORMAT)))
+        self.echo_kwargs = kwargs
+        self.records = deque()
+        self.dropped = 0
+        self.cond = threading.Condition(threading.Lock())
+        self.deliver_lock = threading.Lock()  # keeps batches in order
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, name="EchoHandler")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def get_style(self, levelno):
+        levels = [level for level in self.styles if level <= levelno]
+        return self.styles[max(levels)] if levels else {}
+
+    def emit(self, record):
+        try:
+            text = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+
+        with self.cond:
+            if self.capacity and len(self.records) >= self.capacity:
+                self.dropped += 1
+                if record.levelno < self.keep_level:
+                    return
+
+                self.records.popleft()
+
+            if not self.records:
+                self.cond.notify()
+
+            self.records.append((record.levelno, text))
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not (self.records or self.stopped):
+                    self.cond.wait()
+
+                if not self.stopped:  # gather what comes meanwhile
+                    self.cond.wait(self.flush_interval)
+
+                stopped = self.stopped
+
+            self.deliver()
+            if stopped:
+                break
+
+    def deliver(self):
+        with self.deliver_lock:
+            with self.cond:
+                records, self.records = self.records, deque()
+                dropped, self.dropped = self.dropped, 0
+
+            if dropped:
+                text = "{} log records dropped".format(dropped)
+                records.appendleft((logging.WARNING, text))
+
+            style = None
+            texts = []
+            for levelno, text in records:
+                level_style = self.get_style(levelno)
+                if texts and level_style != style:
+                    self.echo(texts, style)
+                    texts = []
+
+                style = level_style
+                texts.extend(text.splitlines() or [""])
+
+            if texts:
+                self.echo(texts, style)
+
+    def echo(self, texts, style):
+        kwargs = dict(self.echo_kwargs)
+        if style:
+            kwargs.update(style=style)
+
+        try:
+            self.echo_lines(texts, **kwargs)
+        except RuntimeError:  # the window is gone
+            pass
+        except Exception:
+            if logging.raiseExceptions:
+                traceback.print_exc(file=sys.stderr)
+
+    def flush(self):
+        self.deliver()
+
+    def close(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(5)
+
+        super(EchoHandler, self).close()
@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, unicode_literals
+
+import gzip
+import os
+import shutil
+import threading
+from datetime import date, datetime
+from time import time
+
+try:
+    from time import perf_counter
+except ImportError:  # Python 2
+    from time import time as perf_counter
+
+import six
+from six.moves import queue
+
+import wxbreads.echo as wxe
+
+try:
+    import lzma
+except ImportError:  # Python 2
+    lzma = None
+
+COMPRESSORS = dict(gz=gzip.open)
+if lzma is not None:
+    COMPRESSORS.update(xz=lzma.open)
+
+
+def encode_record(text, encoding="utf-8"):
+    if isinstance(text, six.text_type):
+        return text.encode(encoding, "replace")
+
+    return text
+
+
+def is_rotated(path, handle):
+    """Check if path no longer points to the opened file (moved/truncated)."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return True
+
+    fst = os.fstat(handle.fileno())
+    if st.st_ino and (st.st_ino, st.st_dev) != (fst.st_ino, fst.st_dev):
+        return True
+
+    return st.st_size < handle.tell()
+
+
+def compress_file(path, method="gz"):
+    """Compress path to path.gz/path.xz and remove it, return the new path."""
+    opener = COMPRESSORS.get(method) or COMPRESSORS["gz"]
+    target = "{}.{}".format(path, "xz" if opener is not gzip.open else "gz")
+    with open(path, "rb") as src:
+        with opener(target, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    os.remove(path)
+    return target
+
+
+def get_rotated_files(path):
+    """Rotated segments of path (path.<date...>[.gz|.xz]), oldest first."""
+    folder, name = os.path.split(os.path.abspath(path))
+    prefix = "{}.".format(name)
+    segments = []
+    for fname in os.listdir(folder):
+        if fname.startswith(prefix) and fname[len(prefix) :][:1].isdigit():
+            fpath = os.path.join(folder, fname)
+            segments.append((os.path.getmtime(fpath), fpath))
+
+    return [fpath for _, fpath in sorted(segments)]
+
+
+def prune_rotated_files(path, backup_count=0):
+    if backup_count <= 0:
+        return
+
+    for name in get_rotated_files(path)[:-backup_count]:
+        try:
+            os.remove(name)
+        except OSError:
+            pass
+
+
+def finish_rotation(path, rotated, compress=None, backup_count=0):
+    if compress:
+        try:
+            compress_file(rotated, compress)
+        except (IOError, OSError):
+            pass
+
+    prune_rotated_files(path, backup_count)
+
+
+class LogSinks(object):
+    """Keep echo log files open and buffered between writes.
+
+    buffer_size: bytes buffered per file before it is written to disk
+    flush_interval: seconds between forced flushes, 0 to flush every write
+    check_rotation: reopen files that were moved or truncated by others
+    max_bytes: rotate a file before it grows over max_bytes, 0 never
+    daily: rotate a file when the day changes
+    backup_count: rotated segments kept per file, 0 keeps all
+    compress: gz/xz to compress rotated segments in a background thread
+    """
+
+    def __init__(self, buffer_size=64 * 1024, flush_interval=1.0, **kwargs):
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.check_rotation = kwargs.get("check_rotation", True)
+        self.max_bytes = kwargs.get("max_bytes", 0)
+        self.daily = kwargs.get("daily", False)
+        self.backup_count = kwargs.get("backup_count", 0)
+        self.compress = kwargs.get("compress")
+        self.handles = {}
+        self.opened = {}  # path -> date of the data in the file
+        self.rotate_failed = {}  # path -> time its rename last failed
+        self.lock = threading.RLock()
+        self.last_flush = time()
+        self.writes = 0
+        self.write_time = 0.0  # seconds spent in write calls
+
+    def get_handle(self, path, mode="ab"):
+        handle = self.handles.get(path)
+        if handle is None:
+            mode = "{}b".format(mode.replace("b", "").replace("t", ""))
+            handle = open(path, mode, self.buffer_size)
+            self.handles[path] = handle
+            if self.daily:
+                try:
+                    day = date.fromtimestamp(os.path.getmtime(path))
+                except OSError:
+                    day = date.today()
+
+                self.opened[path] = day if handle.tell() else date.today()
+
+        return handle
+
+    def need_rotate(self, path, handle, size=0):
+        pos = handle.tell()
+        if self.max_bytes and pos and pos + size > self.max_bytes:
+            return True
+
+        return self.daily and self.opened.get(path) != date.today()
+
+    def get_write_handle(self, path, mode="ab", size=0):
+        handle = self.get_handle(path, mode)
+        if self.need_rotate(path, handle, size) and self.can_rotate(path):
+            self.rotate(path)
+            handle = self.get_handle(path, mode)
+
+        return handle
+
+    def can_rotate(self, path):
+        """False for flush_interval (at least 1s) after a failed rotation,
+        e.g. while another process holds the file on Windows.
+        """
+        failed = self.rotate_failed.get(path)
+        return failed is None or time() - failed >= max(self.flush_interval, 1.0)
+
+    def rotate(self, path):
+        """Move path aside, then compress/prune segments in a thread."""
+        with self.lock:
+            if self.daily and path in self.opened:
+                suffix = self.opened[path].strftime("%Y-%m-%d")
+            else:
+                suffix = datetime.now().strftime("%Y%m%d-%H%M%S")
+
+            self.close_file(path)
+            rotated = "{}.{}".format(path, suffix)
+            i = 1
+            while any(os.path.exists(rotated + ext) for ext in ("", ".gz", ".xz")):
+                rotated = "{}.{}.{}".format(path, suffix, i)
+                i += 1
+
+            try:
+                os.rename(path, rotated)
+            except OSError:
+                self.rotate_failed[path] = time()
+                return
+
+            self.rotate_failed.pop(path, None)
+
+            args = (path, rotated, self.compress, self.backup_count)
+            worker = threading.Thread(target=finish_rotation, args=args)
+            worker.daemon = True
+            worker.start()
+
+    def write(self, paths, data, encoding="utf-8", mode="ab"):
+        data = encode_record(data, encoding)
+        with self.lock:
+            start = perf_counter()
+            for path in paths:
+                self.get_write_handle(path, mode, len(data)).write(data)
+
+            self.maybe_flush()
+            self.add_write_time(perf_counter() - start)
+
+    def write_chunks(self, path, chunks, mode="ab"):
+        data = b"".join(chunks)
+        with self.lock:
+            start = perf_counter()
+            self.get_write_handle(path, mode, len(data)).write(data)
+            self.add_write_time(perf_counter() - start)
+
+    def add_write_time(self, seconds):
+        self.writes += 1
+        self.write_time += seconds
+
+    def get_stats(self):
+        # no lock: the writer thread holds it during slow writes and reading
+        # the counters alone is safe
+        return dict(
+            writes=self.writes, write_ms=self.write_time * 1000, queued=0, dropped=0
+        )
+
+    def maybe_flush(self, fsync=False):
+        if time() - self.last_flush >= self.flush_interval:
+            self.flush(fsync)
+
+    def flush(self, fsync=False):
+        with self.lock:
+            for path, handle in list(self.handles.items()):
+                handle.flush()
+                if fsync:
+                    os.fsync(handle.fileno())
+
+                if self.check_rotation and is_rotated(path, handle):
+                    self.close_file(path)
+
+            self.last_flush = time()
+
+    def close_file(self, path):
+        with self.lock:
+            handle = self.handles.pop(path, None)
+            self.opened.pop(path, None)
+            if handle is not None:
+                handle.close()
+
+    def close(self):
+        with self.lock:
+            for path in list(self.handles):
+                self.close_file(path)
+
+
+class LogWriter(object):
+    """Write echo log records to LogSinks from a background thread.
+
+    Records are queued by write() and committed in groups, one write per
+    file for everything queued meanwhile, so slow disks never block the
+    GUI thread.
+
+    max_queue: max queued records, then write() drops the record (counted
+        in dropped), only other threads wait up to put_timeout seconds
+    fsync: None never, 0 after every group commit, N at most every N secs
+    """
+
+    def __init__(self, sinks=None, max_queue=100000, fsync=None, **kwargs):
+        self.sinks = sinks or LogSinks(**kwargs)
+        self.records = queue.Queue(max_queue)
+        self.fsync = fsync
+        self.batch = kwargs.get("batch", 5000)
+        self.put_timeout = kwargs.get("put_timeout", 0.5)
+        self.dropped = 0
+        self.last_fsync = time()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="LogWriter")
+                self.thread.daemon = True
+                self.thread.start()
+
+    def put(self, record, timeout=None):
+        self.start()
+        try:
+            self.records.put(record, timeout != 0, timeout)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def write(self, paths, data, encoding="utf-8", mode="ab"):
+        timeout = 0 if wxe.in_main_thread() else self.put_timeout
+        self.put((tuple(paths), data, encoding, mode), timeout)
+
+    def get_batch(self):
+        try:
+            records = [self.records.get(timeout=self.sinks.flush_interval or 1)]
+        except queue.Empty:
+            return []
+
+        while len(records) < self.batch:
+            try:
+                records.append(self.records.get_nowait())
+            except queue.Empty:
+                break
+
+        return records
+
+    def commit(self, records):
+        groups = {}
+        for record in records:
+            paths, data, encoding, mode = record
+            data = encode_record(data, encoding)
+            for path in paths:
+                groups.setdefault((path, mode), []).append(data)
+
+        for (path, mode), chunks in groups.items():
+            try:
+                self.sinks.write_chunks(path, chunks, mode)
+            except (IOError, OSError):
+                self.dropped += len(chunks)
+
+    def sync(self):
+        if self.fsync is not None and time() - self.last_fsync >= self.fsync:
+            self.sinks.flush(fsync=True)
+            self.last_fsync = time()
+        else:
+            self.sinks.maybe_flush()
+
+    def run(self):
+        while True:
+            records = self.get_batch()
+            stop = False
+            pending = []
+            for record in records:
+                if record is None:
+                    stop = True
+                elif not isinstance(record, tuple):  # flush() request
+                    self.commit(pending)
+                    pending = []
+                    self.sinks.flush(self.fsync is not None)
+                    record.set()
+                else:
+                    pending.append(record)
+
+            self.commit(pending)
+            self.sync()
+            if stop:
+                break
+
+    def maybe_flush(self):
+        pass  # done by the writer thread
+
+    def get_stats(self):
+        stats = self.sinks.get_stats()
+        stats.update(queued=self.records.qsize(), dropped=self.dropped)
+        return stats
+
+    def flush(self, timeout=5):
+        """Wait until queued records are written and flushed."""
+        if self.thread is None or not self.thread.is_alive():
+            self.sinks.flush(self.fsync is not None)
+            return True
+
+        done = threading.Event()
+        if self.put(done, timeout):
+            return done.wait(timeout)
+
+        return False
+
+    def close(self, timeout=5):
+        """Drain the queue (waiting up to timeout seconds), close files."""
+        if self.thread is not None and self.thread.is_alive():
+            if self.put(None, timeout):
+                self.thread.join(timeout)
+
+        self.sinks.close()
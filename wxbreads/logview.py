@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+from datetime import datetime
+
+import wx
+
+import wxbreads.echo as wxe
+import wxbreads.logfile as wxlf
+import wxbreads.utils as wxu
+import wxbreads.widgets as wxw
+from wxbreads.base import BaseDialog
+
+
+class LogView(wx.VListBox):
+    """Virtual echo pane, only the visible lines are drawn.
+
+    Lines are kept in an EchoRing of at most max_lines records, so memory
+    and drawing cost stay the same however long the app runs.
+    """
+
+    def __init__(self, parent, id=-1, max_lines=100000, **kwargs):
+        kw = dict(
+            size=kwargs.pop("size", (-1, -1)),
+            style=kwargs.pop("style", wx.BORDER_SUNKEN),
+            name=kwargs.pop("name", "wxLogView"),
+        )
+        super(LogView, self).__init__(parent, id, **kw)
+        self.ring = wxe.EchoRing(max_lines)
+        self.fonts = {}
+        self.follow = True  # keep the last line visible
+        self.SetBackgroundColour(kwargs.pop("bg", "white"))
+        self.line_height = self.GetCharHeight() + 2
+        self.SetItemCount(0)
+
+    def get_font(self, key):
+        font = self.fonts.get(key)
+        if font is None:
+            _, _, _, face, size, bold, italic, underline = key
+            font = wx.Font(self.GetFont())
+            if face:
+                font.SetFaceName(face)
+
+            if size:
+                font.SetPointSize(size)
+
+            font.SetWeight(wx.FONTWEIGHT_BOLD if bold else wx.FONTWEIGHT_NORMAL)
+            font.SetStyle(wx.FONTSTYLE_ITALIC if italic else wx.FONTSTYLE_NORMAL)
+            font.SetUnderlined(underline)
+            self.fonts[key] = font
+
+        return font
+
+    def OnMeasureItem(self, n):
+        return self.line_height
+
+    def get_runs(self, n):
+        return self.ring.get_runs(n)
+
+    def OnDrawItem(self, dc, rect, n):
+        runs = self.get_runs(n)
+        extents = []
+        for key, text in runs:
+            dc.SetFont(self.get_font(key))
+            extents.append(dc.GetTextExtent(text)[0])
+
+        x = rect.x + 2
+        align = next((key[0] for key, _ in runs if key[0]), None)
+        if align in (wx.TEXT_ALIGNMENT_CENTRE, wx.TEXT_ALIGNMENT_RIGHT):
+            free = rect.width - sum(extents) - 4
+            x += max(free // 2 if align == wx.TEXT_ALIGNMENT_CENTRE else free, 0)
+
+        for (key, text), width in zip(runs, extents):
+            fg, bg = key[1], key[2]
+            dc.SetFont(self.get_font(key))
+            dc.SetTextForeground(fg or "black")
+            if bg:
+                dc.SetBackgroundMode(wx.SOLID)
+                dc.SetTextBackground(bg)
+            else:
+                dc.SetBackgroundMode(wx.TRANSPARENT)
+
+            dc.DrawText(text, x, rect.y + 1)
+            x += width
+
+    def is_at_bottom(self):
+        return self.GetVisibleRowsEnd() >= self.GetItemCount()
+
+    def scroll_to_end(self):
+        rows = self.GetVisibleRowsEnd() - self.GetVisibleRowsBegin()
+        self.ScrollToRow(max(self.GetItemCount() - max(rows, 1), 0))
+
+    def append_runs(self, runs, clear=False):
+        """Same input as utils.render_echo_runs, for the echo pipeline."""
+        follow = self.follow and self.is_at_bottom()
+        if clear:
+            self.ring.clear()
+
+        self.ring.add_runs(runs)
+        self.SetItemCount(len(self.ring))
+        if follow:
+            self.scroll_to_end()
+
+        self.RefreshAll()
+
+    def show_line(self, row):
+        if not 0 <= row < self.GetItemCount():
+            return False
+
+        rows = self.GetVisibleRowsEnd() - self.GetVisibleRowsBegin()
+        self.SetSelection(row)
+        self.ScrollToRow(max(row - rows // 2, 0))
+        self.RefreshAll()
+        return True
+
+    def get_text(self, sep="\n"):
+        return sep.join(self.ring.get_text(i) for i in range(len(self.ring)))
+
+    def Clear(self):
+        self.ring.clear()
+        self.SetItemCount(0)
+        self.RefreshAll()
+
+
+class LogFileView(LogView):
+    """Paged view of a (huge) log file, read through a LogFileIndex.
+
+    Only a page of lines around the drawn ones is decoded, the line count
+    grows while the index is built in the background.
+    """
+
+    page_lines = 500
+
+    def __init__(self, parent, path, id=-1, encoding="utf-8", **kwargs):
+        super(LogFileView, self).__init__(parent, id, max_lines=1, **kwargs)
+        self.follow = False
+        self.index = wxlf.LogFileIndex(path, encoding).start()
+        self.page_first = 0
+        self.page = []
+        self.timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.on_index_tick, self.timer)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self.on_destroy)
+        self.on_index_tick()
+        if not self.index.done:
+            self.timer.Start(200)
+
+    def get_line(self, n):
+        if not self.page_first <= n < self.page_first + len(self.page):
+            self.page_first = max(n - self.page_lines // 2, 0)
+            self.page = self.index.get_lines(self.page_first, self.page_lines)
+
+        i = n - self.page_first
+        return self.page[i] if i < len(self.page) else ""
+
+    def get_runs(self, n):
+        return [(wxu.DEFAULT_STYLE_KEY, self.get_line(n))]
+
+    def on_index_tick(self, evt=None):
+        count = self.index.get_line_count()
+        if count != self.GetItemCount():
+            self.SetItemCount(count)
+            self.RefreshAll()
+
+        if self.index.done and self.timer.IsRunning():
+            self.timer.Stop()
+
+    def jump_to(self, target):
+        """Show a line number (0 based) or the first line at a datetime."""
+        if isinstance(target, datetime):
+            target = self.index.find_ts(target)
+
+        return self.show_line(min(target, self.GetItemCount() - 1))
+
+    def get_text(self, sep="\n"):
+        return ""  # the file may not fit in memory
+
+    def on_destroy(self, evt):
+        if evt.GetEventObject() is self:
+            self.timer.Stop()
+            self.index.close()
+
+        evt.Skip()
+
+
+class LogFileDialog(BaseDialog):
+    """View a log file written by the echo pipeline, see LogFileView."""
+
+    app_title = "Log Viewer"
+
+    def __init__(self, path="", **kwargs):
+        kwargs.setdefault("style", wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+        kwargs.setdefault("size", (900, 600))
+        super(LogFileDialog, self).__init__(**kwargs)
+        vbox = wx.BoxSizer(wx.VERTICAL)
+        _, self.goto_tc = wxw.add_text_row(
+            self,
+            vbox,
+            label="Go to line/time",
+            ssize=(300, -1),
+            sstyle=wx.TE_PROCESS_ENTER,
+            t=self.t,
+        )
+        self.view = LogFileView(self, path, encoding=kwargs.get("encoding", "utf-8"))
+        wxw.pack(self.view, vbox, prop=1, flag="e,a")
+        self.status_lbl = wxw.add_label(self, sizer=vbox)
+        self.goto_tc.Bind(wx.EVT_TEXT_ENTER, self.on_goto)
+        self.timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.on_status_tick, self.timer)
+        self.timer.Start(500)
+        self.base_layout(self, vbox)
+        self.on_status_tick()
+
+    def on_goto(self, evt=None):
+        target = wxlf.parse_jump_target(self.goto_tc.GetValue())
+        if target is not None:
+            self.view.jump_to(target)
+
+    def on_status_tick(self, evt=None):
+        index = self.view.index
+        text = self.tt("{} lines").format(index.get_line_count())
+        if not index.done:
+            text += " ({:.0%})".format(index.progress)
+        elif self.timer.IsRunning():
+            self.timer.Stop()
+
+        self.status_lbl.SetLabel(text)
+
+    def on_quit(self, evt=None):
+        self.timer.Stop()
+        super(LogFileDialog, self).on_quit(evt)
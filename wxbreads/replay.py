@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, unicode_literals
+
+import threading
+from time import sleep, time
+
+import wxbreads.logfile as wxlf
+
+
+class LogReplay(object):
+    """Feed an echo log file back through echo(text, **kwargs), normally
+    BaseBase.add_echo, paced by the timestamp prefixes of its lines.
+
+    speed: 1 original pace, 2 twice as fast, ..., 0 as fast as possible
+    keep_ts: echo the original timestamp prefix instead of a new one
+    kwargs: passed to echo for every line (style, channel, ...)
+    """
+
+    def __init__(self, path, echo, speed=1.0, keep_ts=False, **kwargs):
+        self.path = path
+        self.echo = echo
+        self.speed = speed
+        self.keep_ts = keep_ts
+        self.encoding = kwargs.pop("encoding", "utf-8")
+        self.echo_kwargs = kwargs
+        self.lines = 0
+        self.behind = 0.0  # max seconds the replay ran late
+        self.elapsed = 0.0
+        self.done = False
+        self.stopped = False
+        self.thread = None
+
+    def iter_records(self):
+        """Yield (datetime or None, text) of each line of the file."""
+        with open(self.path, "rb") as f:
+            for line in f:
+                line = line.rstrip(b"\r\n")
+                ts, rest = wxlf.split_echo_ts(line)
+                text = line if self.keep_ts else rest
+                yield ts, text.decode(self.encoding, "replace")
+
+    def run(self):
+        start = time()
+        first = None
+        kwargs = dict(self.echo_kwargs)
+        if self.keep_ts:
+            kwargs.setdefault("ts", False)
+
+        for ts, text in self.iter_records():
+            if self.stopped:
+                break
+
+            if self.speed and ts is not None:
+                if first is None:
+                    first = ts
+
+                due = start + (ts - first).total_seconds() / self.speed
+                delay = due - time()
+                if delay > 0.001:
+                    sleep(delay)
+                else:
+                    self.behind = max(self.behind, -delay)
+
+            self.echo(text, **dict(kwargs))
+            self.lines += 1
+
+        self.elapsed = time() - start
+        self.done = True
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="LogReplay")
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped = True
+
+    def wait(self, timeout=None):
+        """Wait for the replay to finish, return True if it did."""
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+        return self.done
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, unicode_literals
+
+import os
+import subprocess
+import threading
+from time import sleep, time
+
+import wxbreads.echo as wxe
+
+READ_SIZE = 64 * 1024
+MAX_PARTIAL = 64 * 1024  # echo an unterminated line once it gets this long
+DEFAULT_STYLES = dict(
+    stdout={}, stderr=dict(fg="red"), exit=dict(fg="grey", italic=True)
+)
+
+
+class CommandRunner(object):
+    """Run a command and echo its stdout/stderr lines while it runs.
+
+    Each stream is read by its own thread and decoded incrementally, every
+    chunk read is echoed as one batch by echo_lines(texts, style=...),
+    normally BaseBase.add_echo_lines, so the GUI thread never waits.
+
+    styles: stream (stdout/stderr/exit) -> echo style name or kwargs
+    timeout: seconds before the command is killed, None waits forever
+    on_exit: called with the runner (from a worker thread) when it is done
+    kwargs: passed to echo_lines for every batch (channel, ts...), with
+        ansi=True each stream gets its own AnsiParser
+    popen_kwargs: passed to subprocess.Popen (cwd, env, shell...)
+    """
+
+    def __init__(self, args, echo_lines, timeout=None, **kwargs):
+        self.args = args
+        self.echo_lines = echo_lines
+        self.timeout = timeout
+        self.encoding = kwargs.pop("encoding", "utf-8")
+        self.styles = dict(DEFAULT_STYLES, **kwargs.pop("styles", {}))
+        self.on_exit = kwargs.pop("on_exit", None)
+        self.popen_kwargs = kwargs.pop("popen_kwargs", {})
+        self.echo_kwargs = kwargs
+        self.process = None
+        self.returncode = None
+        self.cancelled = False
+        self.detached = False  # stop echoing, the window is going away
+        self.timed_out = False
+        self.started = 0
+        self.elapsed = 0.0
+        self.lines = 0
+        self.readers = []
+        self.ansi_parsers = {}  # stream -> AnsiParser
+        self.waiter = None
+        self.finished = threading.Event()
+
+    @property
+    def is_running(self):
+        return self.process is not None and not self.finished.is_set()
+
+    def start(self):
+        self.started = time()
+        try:
+            self.process = subprocess.Popen(
+                self.args,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=0,
+                **self.popen_kwargs
+            )
+        except OSError as ex:
+            self.echo("exit", ["{}: {}".format(self.get_title(), ex)])
+            self.finish(None)
+            return self
+
+        self.process.stdin.close()
+        for name in ("stdout", "stderr"):
+            reader = threading.Thread(
+                target=self.read, args=(name,), name="CommandRunner-" + name
+            )
+            reader.daemon = True
+            reader.start()
+            self.readers.append(reader)
+
+        self.waiter = threading.Thread(target=self.wait_exit, name="CommandRunner")
+        self.waiter.daemon = True
+        self.waiter.start()
+        return self
+
+    def get_title(self):
+        if isinstance(self.args, (list, tuple)):
+            return " ".join("{}".format(arg) for arg in self.args)
+
+        return "{}".format(self.args)
+
+    def echo(self, stream, texts):
+        if self.detached:
+            return
+
+        kwargs = dict(self.echo_kwargs)
+        style = self.styles.get(stream)
+        if style:
+            kwargs.update(style=style)
+
+        if kwargs.get("ansi") is True:
+            parser = self.ansi_parsers.get(stream)
+            if parser is None:
+                parser = self.ansi_parsers[stream] = wxe.AnsiParser()
+
+            kwargs.update(ansi=parser)
+
+        self.lines += len(texts)
+        self.echo_lines(texts, **kwargs)
+
+    def read(self, stream):
+        fd = getattr(self.process, stream).fileno()
+        decoder = wxe.LineDecoder(self.encoding, MAX_PARTIAL)
+        while True:
+            try:
+                data = os.read(fd, READ_SIZE)
+            except OSError:
+                data = b""
+
+            lines = decoder.feed(data, final=not data)
+            if lines:
+                self.echo(stream, lines)
+
+            if not data:
+                break
+
+    def wait_exit(self):
+        deadline = self.started + self.timeout if self.timeout else None
+        while self.process.poll() is None:
+            if deadline is not None and time() >= deadline:
+                self.timed_out = True
+                self.kill()
+                break
+
+            sleep(0.05)
+
+        returncode = self.process.wait()
+        stopped = self.timed_out or self.cancelled
+        for reader in self.readers:  # children may still hold the pipes
+            reader.join(2 if stopped else None)
+
+        self.finish(returncode)
+
+    def finish(self, returncode):
+        self.returncode = returncode
+        self.elapsed = time() - self.started
+        if returncode is not None:
+            if self.timed_out:
+                status = "timed out after {:.1f}s".format(self.timeout)
+            elif self.cancelled:
+                status = "cancelled"
+            else:
+                status = "exited with code {}".format(returncode)
+
+            text = "{}: {} ({:.1f}s)".format(self.get_title(), status, self.elapsed)
+            self.echo("exit", [text])
+
+        self.finished.set()
+        if self.on_exit:
+            self.on_exit(self)
+
+    def kill(self):
+        try:
+            self.process.kill()
+        except OSError:  # already gone
+            pass
+
+    def cancel(self, grace=3.0):
+        """Terminate the command, kill it if still running after grace secs."""
+        if not self.is_running:
+            return
+
+        self.cancelled = True
+        try:
+            self.process.terminate()
+        except OSError:
+            return
+
+        timer = threading.Timer(grace, self.kill_if_running)
+        timer.daemon = True
+        timer.start()
+
+    def stop(self, timeout=1.0):
+        """Cancel the command and echo nothing more, kill it if still
+        running after timeout secs (when the app quits).
+        """
+        self.detached = True
+        self.cancel(timeout)
+        deadline = time() + timeout
+        while self.is_running and self.process.poll() is None:
+            if time() >= deadline:
+                self.kill()
+                break
+
+            sleep(0.05)
+
+    def kill_if_running(self):
+        if self.process.poll() is None:
+            self.kill()
+
+    def wait(self, timeout=None):
+        """Wait until the command and its output are done."""
+        return self.finished.wait(timeout)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import wx
+
+import wxbreads.utils as wxu
+import wxbreads.widgets as wxw
+from wxbreads.base import BaseDialog
+
+
+class EchoSearchDialog(BaseDialog):
+    """Find lines in the echo history of parent (needs parent.echo_index)."""
+
+    app_title = "Find"
+    max_results = 100000
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("style", wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+        super(EchoSearchDialog, self).__init__(**kwargs)
+        self.parent = kwargs.get("parent")
+        self.matches = []
+        self.current = -1
+        self.setup_ui()
+        if kwargs.get("query"):
+            self.query_tc.SetValue(kwargs["query"])
+            self.on_search()
+
+    def setup_ui(self):
+        vbox = wx.BoxSizer(wx.VERTICAL)
+        _, self.query_tc = wxw.add_text_row(
+            self,
+            vbox,
+            label="Find",
+            ssize=(300, -1),
+            sstyle=wx.TE_PROCESS_ENTER,
+            t=self.t,
+        )
+        self.only_cb = wxw.add_checkbox(self, label="Only matching lines", t=self.t)
+        self.partial_cb = wxw.add_checkbox(
+            self, label="Match part of words", value=False, t=self.t
+        )
+        prev_btn = wxw.add_button(self, label="Previous", t=self.t)
+        next_btn = wxw.add_button(self, label="Next", t=self.t)
+        wxw.quick_pack(vbox, wgts=[self.only_cb, self.partial_cb, prev_btn, next_btn])
+
+        self.result_view = wxw.add_logview(
+            self, max_lines=self.max_results, size=(600, 300)
+        )
+        wxw.pack(self.result_view, vbox, prop=1, flag="e,a")
+        self.status_lbl = wxw.add_label(self, sizer=vbox)
+
+        self.query_tc.Bind(wx.EVT_TEXT_ENTER, self.on_search)
+        self.only_cb.Bind(wx.EVT_CHECKBOX, self.on_search)
+        self.partial_cb.Bind(wx.EVT_CHECKBOX, self.on_search)
+        prev_btn.Bind(wx.EVT_BUTTON, self.on_prev)
+        next_btn.Bind(wx.EVT_BUTTON, self.on_next)
+        self.result_view.Bind(wx.EVT_LISTBOX_DCLICK, self.on_result)
+        self.base_layout(self, vbox)
+
+    def on_search(self, evt=None):
+        query = self.query_tc.GetValue().strip()
+        index = self.parent.echo_index
+        seqs = index.search(
+            query, limit=self.max_results, partial=self.partial_cb.GetValue()
+        )
+        self.matches = []
+        runs = []
+        for seq in seqs:
+            text = index.get_text(seq)
+            if text is not None:
+                self.matches.append(seq)
+                runs.append((wxu.DEFAULT_STYLE_KEY, text + "\n"))
+
+        self.current = -1
+        self.result_view.Clear()
+        if self.only_cb.GetValue():
+            self.result_view.append_runs(runs)
+
+        self.status_lbl.SetLabel(self.tt("{} matches").format(len(self.matches)))
+
+    def jump(self, current):
+        if not self.matches:
+            return
+
+        self.current = current % len(self.matches)
+        self.parent.show_echo_line(self.matches[self.current])
+        if self.only_cb.GetValue():
+            self.result_view.show_line(self.current)
+
+    def on_prev(self, evt=None):
+        self.jump(self.current - 1 if self.current >= 0 else -1)
+
+    def on_next(self, evt=None):
+        self.jump(self.current + 1)
+
+    def on_result(self, evt):
+        self.jump(evt.GetSelection())
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import json
+import os
+import struct
+from collections import deque
+from time import time
+
+MAGIC = b"WXBECHO1"
+RECORD = struct.Struct(str("<cI"))  # record type, payload length
+RUN = struct.Struct(str("<HI"))  # style id, text length
+STYLE, LINE, SUFFIX, CLEAR = b"S", b"L", b"X", b"C"
+FLUSH_BYTES = 256 * 1024
+
+
+def encode_key(key):
+    return json.dumps(list(key)).encode("utf-8")
+
+
+def decode_key(data):
+    value = json.loads(data.decode("utf-8"))
+    return tuple(tuple(v) if isinstance(v, list) else v for v in value)
+
+
+class EchoSnapshot(object):
+    """The last max_lines styled lines of an echo pane, kept in a file.
+
+    Rendered runs are split into lines in memory and the complete lines
+    are appended to the file as compact binary records at most every
+    flush_interval seconds. Once the file holds about twice max_lines the
+    memory copy is written anew, so it never grows past that.
+
+    Records are a type byte and a payload length: S style key (json, once
+    per style), L line ([style id, utf-8 text] runs), X repeat suffix of
+    the last line, C pane cleared. A record cut by a crash is ignored.
+    """
+
+    def __init__(self, path, max_lines=1000, flush_interval=1.0):
+        self.path = path
+        self.max_lines = max_lines
+        self.flush_interval = flush_interval
+        self.lines = deque(maxlen=max_lines)  # [runs, suffix run or None]
+        self.partial = []  # runs of the line not ended yet
+        self.style_ids = {}  # style key -> id in the file
+        self.pending = []  # encoded records not written yet
+        self.pending_bytes = 0
+        self.file_lines = 0
+        self.synced = False  # the file was written by this instance
+        self.last_flush = time()
+
+    def load(self):
+        """Read the file back, return [(runs, suffix run or None), ...].
+
+        The file is then written anew from the lines read.
+        """
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except (IOError, OSError):
+            data = b""
+
+        lines = self.read_lines(data) if data.startswith(MAGIC) else []
+        self.lines.extend(lines)
+        self.compact()
+        return [tuple(line) for line in lines]
+
+    def read_lines(self, data):
+        styles = {}
+        lines = deque(maxlen=self.max_lines)
+        pos = len(MAGIC)
+        while pos + RECORD.size <= len(data):
+            kind, size = RECORD.unpack_from(data, pos)
+            pos += RECORD.size
+            if pos + size > len(data):
+                break  # cut by a crash
+
+            payload = data[pos : pos + size]
+            pos += size
+            try:
+                if kind == STYLE:
+                    style_id, key = RUN.unpack_from(payload)[0], payload[RUN.size :]
+                    styles[style_id] = decode_key(key)
+                elif kind == LINE:
+                    lines.append([self.decode_runs(payload, styles), None])
+                elif kind == SUFFIX and lines:
+                    lines[-1][1] = self.decode_runs(payload, styles)[0]
+                elif kind == CLEAR:
+                    lines.clear()
+            except (KeyError, ValueError, struct.error):
+                break
+
+        return lines
+
+    def decode_runs(self, payload, styles):
+        runs = []
+        pos = 0
+        while pos < len(payload):
+            style_id, size = RUN.unpack_from(payload, pos)
+            pos += RUN.size
+            runs.append((styles[style_id], payload[pos : pos + size].decode("utf-8")))
+            pos += size
+
+        return runs
+
+    def get_style_id(self, key):
+        style_id = self.style_ids.get(key)
+        if style_id is None:
+            style_id = self.style_ids[key] = len(self.style_ids)
+            self.add_record(STYLE, RUN.pack(style_id, 0) + encode_key(key))
+
+        return style_id
+
+    def encode_runs(self, runs):
+        chunks = []
+        for key, text in runs:
+            data = text.encode("utf-8")
+            chunks.append(RUN.pack(self.get_style_id(key), len(data)))
+            chunks.append(data)
+
+        return b"".join(chunks)
+
+    def add_record(self, kind, payload=b""):
+        self.pending.append(RECORD.pack(kind, len(payload)) + payload)
+        self.pending_bytes += RECORD.size + len(payload)
+
+    def add_line(self, runs):
+        self.lines.append([runs, None])
+        self.add_record(LINE, self.encode_runs(runs))
+        self.file_lines += 1
+
+    def add_runs(self, runs, clear=False):
+        """Same input as utils.render_echo_runs."""
+        if clear:
+            self.lines.clear()
+            self.partial = []
+            self.add_record(CLEAR)
+
+        for key, text in runs:
+            if "\n" not in text:
+                if text:
+                    self.partial.append((key, text))
+
+                continue
+
+            parts = text.split("\n")
+            for part in parts[:-1]:
+                if part:
+                    self.partial.append((key, part))
+
+                self.add_line(self.partial)
+                self.partial = []
+
+            if parts[-1]:
+                self.partial.append((key, parts[-1]))
+
+        self.maybe_flush()
+
+    def set_suffix(self, key, suffix):
+        """Repeat counter of the last complete line, see set_echo_suffix."""
+        if self.lines and not self.partial:
+            self.lines[-1][1] = (key, suffix)
+            self.add_record(SUFFIX, self.encode_runs([(key, suffix)]))
+
+    def maybe_flush(self):
+        if self.pending_bytes >= FLUSH_BYTES:
+            self.flush()
+        elif self.pending and time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time()
+        if not self.synced or self.file_lines > 2 * self.max_lines:
+            return self.compact()
+
+        if not self.pending:
+            return
+
+        records, self.pending, self.pending_bytes = self.pending, [], 0
+        try:
+            is_new = not os.path.exists(self.path)
+            with open(self.path, "ab") as f:
+                if is_new:
+                    f.write(MAGIC)
+
+                f.write(b"".join(records))
+        except (IOError, OSError):
+            pass
+
+    def compact(self):
+        """Write the lines in memory as a new file."""
+        self.style_ids.clear()
+        self.pending, self.pending_bytes = [], 0
+        for runs, suffix in self.lines:
+            self.add_record(LINE, self.encode_runs(runs))
+            if suffix:
+                self.add_record(SUFFIX, self.encode_runs([suffix]))
+
+        self.file_lines = len(self.lines)
+        self.synced = True
+        records, self.pending, self.pending_bytes = self.pending, [], 0
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(MAGIC)
+                f.write(b"".join(records))
+
+            if os.path.exists(self.path):
+                os.remove(self.path)  # rename does not replace on Windows
+
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError):
+            pass
@@ -3,15 +3,26 @@
 
 from __future__ import division, unicode_literals
 
+import re
 import sys
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from time import strftime
 
+try:
+    from time import perf_counter
+except ImportError:  # Python 2
+    from time import time as perf_counter
+
 import six
 import windbreads.utils as wdu
 import wx
 import wx.richtext as rt
 
+import wxbreads.echo as wxe
+import wxbreads.logsink as wxls
+
 RTC_ALIGNS = dict(
     default=wx.TEXT_ALIGNMENT_DEFAULT,
     left=wx.TEXT_ALIGNMENT_LEFT,
@@ -121,6 +132,69 @@ def wxdate2pydate(date):
     return None
 
 
+class TranslationCache(object):
+    """LRU cache of translated texts, keyed by (text, translator).
+
+    A new translator (language switch) never hits old entries, clear() just
+    frees them.
+    """
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def translate(self, text, t=None):
+        if not (t and text):
+            return text
+
+        key = (text, t)
+        try:
+            with self.lock:
+                value = self.cache.pop(key)
+                self.cache[key] = value  # most recently used
+                self.hits += 1
+                return value
+        except KeyError:
+            pass
+        except TypeError:  # unhashable text
+            return t(text)
+
+        value = t(text)
+        with self.lock:
+            self.misses += 1
+            self.cache[key] = value
+            if len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+    def get_stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return dict(
+                hits=self.hits,
+                misses=self.misses,
+                size=len(self.cache),
+                max_size=self.max_size,
+                hit_rate=self.hits / total if total else 0.0,
+            )
+
+
+TRANSLATIONS = TranslationCache()
+
+
+def ttt(text, t=None):
+    """Cached version of wdu.ttt."""
+    return TRANSLATIONS.translate(text, t)
+
+
 def cat_echo_text(**kwargs):
     args = kwargs.get("args")
     kargs = kwargs.get("kargs")
@@ -128,21 +202,29 @@ def cat_echo_text(**kwargs):
     text = kwargs.get("text", "")
     if text:
         if kargs:
-            return wdu.ttt(text, t).format(**kargs)
+            return ttt(text, t).format(**kargs)
 
         if args:
             if not isinstance(args, (tuple, list)):
                 args = (args,)
 
-            return wdu.ttt(text, t).format(*args)
+            return ttt(text, t).format(*args)
 
-        return wdu.ttt(text, t)
+        return ttt(text, t)
 
     return text
 
 
 def write_echo_text(**kwargs):
-    ts_text = kwargs.get("ts_text")
+    log_file = kwargs.get("log_file")
+    log_files = kwargs.get("log_files", [])
+    if log_file:
+        log_files = [log_file]
+
+    if not log_files:
+        return
+
+    ts_text = kwargs.get("ts_text") or ""
     if kwargs.get("tff"):  # t for file
         text = cat_echo_text(**kwargs)
     else:
@@ -151,155 +233,681 @@ def write_echo_text(**kwargs):
         text = cat_echo_text(**kargs)
 
     encoding = kwargs.get("encoding", "utf-8")
-    if six.PY2 and isinstance(text, six.text_type):
-        text = text.encode(encoding)
-    elif six.PY3:
-        text = bytes(text, encoding)
-        if ts_text:
-            ts_text = bytes(ts_text, encoding)
-
-    nl = kwargs.get("nl", True)
     log_mode = kwargs.get("log_mode", "a" if six.PY2 else "ab")
+    if kwargs.get("echo_repeat"):  # collapsed repeats of the line
+        text += wxe.REPEAT_FORMAT.format(kwargs["echo_repeat"])
 
-    log_file = kwargs.get("log_file")
-    log_files = kwargs.get("log_files", [])
-    if log_file:
-        log_files = [log_file]
+    if kwargs.get("ansi"):
+        text = wxe.strip_ansi(text)
+
+    newline = six.ensure_text(wdu.NEW_LINE) if kwargs.get("nl", True) else ""
+    record = "{}{}{}".format(six.ensure_text(ts_text), text, newline)
+    log_sinks = kwargs.get("log_sinks")
+    if log_sinks is not None:
+        log_sinks.write(log_files, record, encoding=encoding, mode=log_mode)
+        return
 
-    newline = wdu.NEW_LINE
-    if six.PY3:
-        ts_text = six.ensure_str(ts_text)
-        text = six.ensure_str(text)
-        newline = six.ensure_str(wdu.NEW_LINE)
+    if six.PY2 or "b" in log_mode:
+        record = wxls.encode_record(record, encoding)
 
     for log_file in log_files:
         with open(log_file, log_mode) as f:
-            if ts_text:
-                f.write(ts_text)
+            f.write(record)
 
-            f.write(text)
-            if nl:
-                f.write(newline)
 
+def get_echo_ts_text(ts=True, keep_date=True):
+    if not ts:
+        return ""
 
-def echo_text(
-    rtc,
-    text="",
+    now = datetime.now()
+    if keep_date:
+        return "[{}] ".format(now)
+
+    return "[{}] ".format(str(now).split(" ", 1)[-1])
+
+
+MAX_DETECT_BYTES = 64 * 1024  # bytes given to detect_encoding at most
+DECODE_ENCODINGS = {}  # source -> last encoding that decoded its bytes
+
+
+def decode_text(data, source=None, max_detect=MAX_DETECT_BYTES):
+    """Decode bytes with strict UTF-8 (so ASCII too) or else the last
+    encoding detected for source, only detecting the encoding (of the first
+    max_detect bytes) when both fail.
+    """
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        pass
+
+    last = DECODE_ENCODINGS.get(source)
+    if last and last != "utf-8":
+        try:
+            return data.decode(last)
+        except (UnicodeDecodeError, LookupError):
+            pass
+
+    encoding = wdu.detect_encoding(data[:max_detect])["encoding"] or "utf-8"
+    try:
+        text = data.decode(encoding)
+    except (UnicodeDecodeError, LookupError):
+        encoding = "utf-8"
+        text = data.decode(encoding, "replace")
+
+    if len(DECODE_ENCODINGS) >= 256:
+        DECODE_ENCODINGS.clear()
+
+    DECODE_ENCODINGS[source] = encoding
+    return text
+
+
+def to_text(value, source=None):
+    if isinstance(value, six.text_type):
+        return value
+
+    if isinstance(value, six.binary_type):
+        return decode_text(value, source) if value else ""
+
+    return "{}".format(value)
+
+
+def to_echo_text(text, source="echo"):
+    return to_text(text, source)
+
+
+def get_style_value(value):
+    if isinstance(value, wx.Colour):
+        return value.GetAsString(wx.C2S_HTML_SYNTAX)
+
+    return value
+
+
+def get_echo_style_key(
     fg=None,
     bg=None,
-    ts=True,
-    nl=True,
     italic=False,
     align=None,
     underline=False,
     bold=False,
-    ts_style=False,
     font=None,
     size=None,
-    clear=False,
-    keep_date=True,
     **kwargs
 ):
-    if ts:
-        now = datetime.now()
-        if keep_date:
-            ts_text = "[{}] ".format(now)
-        else:
-            ts_text = "[{}] ".format(str(now).split(" ", 1)[-1])
+    return (
+        RTC_ALIGNS.get(align),
+        get_style_value(fg),
+        get_style_value(bg),
+        font,
+        size,
+        bold is True,
+        italic is True,
+        bool(underline),
+    )
+
+
+DEFAULT_STYLE_KEY = get_echo_style_key()
+REPEAT_STYLE_KEY = get_echo_style_key(fg="grey", italic=True)
+MAX_ECHO_STYLES = 1024
+ECHO_STYLES = {}  # style key -> RichTextAttr
+
+
+def create_echo_style(key):
+    align, fg, bg, font, size, bold, italic, underline = key
+    rta = rt.RichTextAttr()
+    rta.SetAlignment(align or RTC_ALIGNS["default"])
+    rta.SetTextColour(fg or "black")
+    rta.SetBackgroundColour(bg or "white")
+    if font:
+        rta.SetFontFaceName(font)
 
-    else:
-        ts_text = ""
+    if size:
+        rta.SetFontSize(size)
+
+    rta.SetFontWeight(wx.FONTWEIGHT_BOLD if bold else wx.FONTWEIGHT_NORMAL)
+    rta.SetFontStyle(wx.FONTSTYLE_ITALIC if italic else wx.FONTSTYLE_NORMAL)
+    rta.SetFontUnderlined(underline)
+    return rta
+
+
+def get_echo_style(key):
+    """Return the shared RichTextAttr of a style key, created only once."""
+    rta = ECHO_STYLES.get(key)
+    if rta is None:
+        if len(ECHO_STYLES) >= MAX_ECHO_STYLES:
+            ECHO_STYLES.clear()
+
+        rta = ECHO_STYLES[key] = create_echo_style(key)
+
+    return rta
+
+
+INLINE_FLAGS_RE = re.compile(r"\(\?([aiLmsux]+)\)")
+BACKREF_RE = re.compile(r"\\(\\|[1-9])")
+STYLE_KEY_FIELDS = ("align", "fg", "bg", "font", "size", "bold", "italic", "underline")
 
-    if text and isinstance(text, six.string_types):
-        if not isinstance(text, six.text_type):
-            utext = text.decode(wdu.detect_encoding(text)["encoding"])
+
+class HighlightRules(object):
+    """Pattern -> style rules applied to echoed lines in one regex pass.
+
+    All patterns are compiled into a single alternation of named groups,
+    so a line is scanned once whatever the number of rules. Matched spans
+    get the line style overridden by the style kwargs of their rule.
+
+    rules: [(pattern, style kwargs), ...]
+    flags: re flags of all patterns, e.g. re.IGNORECASE
+    """
+
+    def __init__(self, rules=(), flags=0):
+        self.flags = flags
+        self.patterns = []
+        self.styles = []  # rule index -> (style key, overridden fields)
+        self.whole_lines = []
+        self.keys = {}  # (line style key, rule index) -> style key
+        self.regex = None
+        for rule in rules:
+            pattern, style = rule[:2]
+            self.add(pattern, **style)
+
+    def __bool__(self):
+        return bool(self.patterns)
+
+    __nonzero__ = __bool__
+
+    def add(self, pattern, literal=False, whole_line=False, **style):
+        """literal: match pattern as plain text
+        whole_line: style the whole line, not only the matched text
+        """
+        if literal:
+            pattern = re.escape(pattern)
         else:
-            utext = text
+            pattern = self.check_pattern(pattern)
+
+        fields = set(STYLE_KEY_FIELDS.index(k) for k in style if k in STYLE_KEY_FIELDS)
+        self.patterns.append(pattern)
+        try:  # fail here, not when lines are echoed
+            self.compile()
+        except re.error:
+            self.patterns.pop()
+            self.compile()
+            raise
+
+        self.styles.append((get_echo_style_key(**style), fields))
+        self.whole_lines.append(whole_line)
+        self.keys.clear()
+
+    def check_pattern(self, pattern):
+        """Scope leading inline flags to the pattern, reject backreferences
+        by number (the rule groups shift them).
+        """
+        if any(m.group(1) != "\\" for m in BACKREF_RE.finditer(pattern)):
+            raise ValueError(
+                "numbered backreference in {!r}, use (?P<name>...) and "
+                "(?P=name)".format(pattern)
+            )
+
+        m = INLINE_FLAGS_RE.match(pattern)
+        if m:
+            flags = m.group(1)
+            if sys.version_info < (3, 6) or set(flags) - set("imsx"):
+                raise ValueError(
+                    "inline flags of {!r} apply to all rules, pass "
+                    "HighlightRules(flags=...) instead".format(pattern)
+                )
+
+            pattern = "(?{}:{})".format(flags, pattern[m.end() :])
+
+        return pattern
+
+    def compile(self):
+        self.regex = re.compile(
+            "|".join("(?P<h{}>{})".format(i, p) for i, p in enumerate(self.patterns)),
+            self.flags,
+        )
+
+    def get_key(self, key, rule):
+        merged = self.keys.get((key, rule))
+        if merged is None:
+            style, fields = self.styles[rule]
+            merged = tuple(style[i] if i in fields else v for i, v in enumerate(key))
+            self.keys[(key, rule)] = merged
+
+        return merged
+
+    def apply(self, text, key=DEFAULT_STYLE_KEY):
+        """Split text into [(style_key, text), ...] runs."""
+        if not self.patterns:
+            return [(key, text)]
+
+        if self.regex is None:
+            self.compile()
+
+        runs = []
+        pos = 0
+        for m in self.regex.finditer(text):
+            start, end = m.span()
+            if start == end:
+                continue
+
+            rule = int(m.lastgroup[1:])
+            if self.whole_lines[rule]:
+                return [(self.get_key(key, rule), text)]
+
+            if start > pos:
+                runs.append((key, text[pos:start]))
+
+            runs.append((self.get_key(key, rule), text[start:end]))
+            pos = end
+
+        if pos < len(text):
+            runs.append((key, text[pos:]))
+
+        return runs
+
+
+ANSI_KEYS = {}  # (line style key, ansi style) -> style key
+
+
+def get_ansi_key(key, style):
+    """Line style key overridden by an AnsiParser style."""
+    merged = ANSI_KEYS.get((key, style))
+    if merged is None:
+        if len(ANSI_KEYS) >= MAX_ECHO_STYLES:
+            ANSI_KEYS.clear()
+
+        align, fg, bg, font, size, bold, italic, underline = key
+        ansi_fg, ansi_bg, ansi_bold, ansi_italic, ansi_underline = style
+        merged = (
+            align,
+            ansi_fg or fg,
+            ansi_bg or bg,
+            font,
+            size,
+            bold or ansi_bold,
+            italic or ansi_italic,
+            underline or ansi_underline,
+        )
+        ANSI_KEYS[(key, style)] = merged
+
+    return merged
+
+
+def get_ansi_parser(rtc):
+    """AnsiParser keeping the SGR state of the lines echoed to rtc."""
+    parser = getattr(rtc, "echo_ansi_parser", None)
+    if parser is None:
+        parser = rtc.echo_ansi_parser = wxe.AnsiParser()
+
+    return parser
+
+
+def get_echo_runs(text="", ts=True, nl=True, ts_style=False, keep_date=True, **kwargs):
+    """Write text to log files, return [(style_key, text), ...] to render.
+
+    ansi: an AnsiParser (or True for a fresh one), escape sequences in text
+        become styled runs and are left out of the log files
+    """
+    ts_text = get_echo_ts_text(ts, keep_date)
+    utext = to_echo_text(text, kwargs.get("source", "echo"))
+    segments = None
+    parser = kwargs.get("ansi")
+    if parser:
+        if parser is True:
+            parser = wxe.AnsiParser()
 
-    else:
-        utext = "{}".format(text)
+        segments = parser.feed(cat_echo_text(text=utext, **kwargs))
+        utext = "".join(segment for _, segment in segments)
+        kwargs.update(args=None, kargs=None, t=None, ansi=None)
 
     write_echo_text(ts_text=ts_text, text=utext, nl=nl, **kwargs)
     if kwargs.get("no_echo", False):
+        return []
+
+    runs = []
+    if not segments:
+        segments = [(None, cat_echo_text(text=utext, **kwargs))]
+
+    if ts_text and ts_style and not isinstance(ts_style, dict):
+        style, text = segments[0]
+        segments[0] = (style, ts_text + text)
+    elif ts_text:
+        if ts_style:  # own style for the timestamp
+            runs.append((get_echo_style_key(**ts_style), ts_text))
+        else:
+            runs.append((DEFAULT_STYLE_KEY, ts_text))
+
+    key = get_echo_style_key(**kwargs)
+    highlight = kwargs.get("highlight")
+    for style, segment in segments:
+        seg_key = key if style is None else get_ansi_key(key, style)
+        if highlight:
+            runs.extend(highlight.apply(segment, seg_key))
+        else:
+            runs.append((seg_key, segment))
+
+    if nl:
+        runs.append((DEFAULT_STYLE_KEY, "\n"))
+
+    return runs
+
+
+def merge_echo_runs(runs):
+    merged = []
+    for key, text in runs:
+        if merged and merged[-1][0] == key:
+            merged[-1][1].append(text)
+        else:
+            merged.append((key, [text]))
+
+    return [(key, "".join(texts)) for key, texts in merged]
+
+
+def add_trimmed_lines(rtc, count):
+    """Count paragraphs removed from the top, to keep line numbers absolute."""
+    rtc.echo_trimmed = getattr(rtc, "echo_trimmed", 0) + count
+
+
+def get_echo_line_no(rtc):
+    """Absolute number of the line the next echo lands on."""
+    if hasattr(rtc, "ring"):  # virtual log view
+        return rtc.ring.first + len(rtc.ring.lines)
+
+    return getattr(rtc, "echo_trimmed", 0) + rtc.GetNumberOfLines() - 1
+
+
+def show_echo_line(rtc, line_no):
+    """Scroll to and select an absolute echo line, False if it is gone."""
+    if hasattr(rtc, "show_line"):  # virtual log view
+        return rtc.show_line(line_no - rtc.ring.first)
+
+    para = line_no - getattr(rtc, "echo_trimmed", 0)
+    if line_no < 0 or para < 0 or para >= rtc.GetNumberOfLines():
+        return False
+
+    start = rtc.XYToPosition(0, para)
+    rtc.SetSelection(start, start + rtc.GetLineLength(para))
+    rtc.ShowPosition(start)
+    return True
+
+
+def trim_echo_lines(rtc, max_lines=0, max_chars=0):
+    """Remove the oldest paragraphs, in chunks of ~10% to amortize the cost."""
+    para = 0
+    if max_lines:
+        count = rtc.GetNumberOfLines()
+        if count > max_lines + max(max_lines // 10, 1):
+            para = count - max_lines
+
+    if max_chars:
+        last = rtc.GetLastPosition()
+        if last > max_chars + max(max_chars // 10, 1):
+            para = max(para, rtc.PositionToXY(last - max_chars)[-1] + 1)
+
+    if para > 0:
+        rtc.Remove(0, rtc.XYToPosition(0, para))
+        add_trimmed_lines(rtc, para)
+
+
+def render_echo_runs(rtc, runs, clear=False, max_lines=0, max_chars=0):
+    if not (runs or clear):
+        return
+
+    snapshot = getattr(rtc, "echo_snapshot", None)
+    if snapshot is not None:
+        snapshot.add_runs(runs, clear)
+
+    if hasattr(rtc, "append_runs"):  # virtual log view
+        rtc.append_runs(runs, clear)
+        return
+
+    rtc.Freeze()
+    rtc.BeginSuppressUndo()
+    try:
         if clear:
+            add_trimmed_lines(rtc, rtc.GetNumberOfLines() - 1)
             rtc.Clear()
 
+        rtc.SetInsertionPointEnd()
+        for key, text in merge_echo_runs(runs):
+            rtc.BeginStyle(get_echo_style(key))
+            rtc.WriteText(text)
+            rtc.EndStyle()
+
+        rtc.echo_suffix_len = 0
+        trim_echo_lines(rtc, max_lines, max_chars)
+        rtc.ShowPosition(rtc.GetLastPosition())
+    finally:
+        rtc.EndSuppressUndo()
+        rtc.Thaw()
+
+
+def set_echo_suffix(rtc, suffix, key=REPEAT_STYLE_KEY):
+    """Replace the suffix (repeat counter) of the last echoed line."""
+    snapshot = getattr(rtc, "echo_snapshot", None)
+    if snapshot is not None:
+        snapshot.set_suffix(key, suffix)
+
+    if hasattr(rtc, "ring"):  # virtual log view
+        rtc.ring.set_suffix(key, suffix)
+        rtc.RefreshRow(len(rtc.ring) - 1)
         return
 
-    rtc.SetInsertionPointEnd()
-    rta = rt.RichTextAttr()
-    rta.SetAlignment(RTC_ALIGNS["default"])
-    rta.SetTextColour("black")
-    rta.SetBackgroundColour("white")
-    rta.SetFontStyle(wx.FONTSTYLE_NORMAL)
-    rta.SetFontWeight(wx.FONTWEIGHT_NORMAL)
-    rta.SetFontUnderlined(False)
-    rtc.SetDefaultStyle(rta)
-    if ts_text and not ts_style:
-        rtc.WriteText(ts_text)
-
-    align = RTC_ALIGNS.get(align)
-    if align:
-        rta.SetAlignment(align)
-
-    if fg:
-        rta.SetTextColour(fg)
-
-    if bg:
-        rta.SetBackgroundColour(bg)
+    para = rtc.GetNumberOfLines() - 2  # last paragraph is the empty one
+    if para < 0:
+        return
 
-    if font:
-        rta.SetFontFaceName(font)
+    end = rtc.XYToPosition(0, para) + rtc.GetLineLength(para)
+    start = end - getattr(rtc, "echo_suffix_len", 0)
+    rtc.Freeze()
+    rtc.BeginSuppressUndo()
+    try:
+        if start < end:
+            rtc.Remove(start, end)
+
+        rtc.SetInsertionPoint(start)
+        rtc.BeginStyle(get_echo_style(key))
+        rtc.WriteText(suffix)
+        rtc.EndStyle()
+        rtc.echo_suffix_len = len(suffix)
+    finally:
+        rtc.EndSuppressUndo()
+        rtc.Thaw()
+
+
+def write_echo_repeats(text, kwargs):
+    """Write the repeats collapsed since the last update as raw lines."""
+    if kwargs.get("echo_repeat_log") != "raw":
+        return
 
-    if size:
-        rta.SetFontSize(size)
+    kw = wxe.get_style_kwargs(kwargs)
+    kw.update(no_echo=True)
+    for _ in range(kwargs["echo_repeat"] - kwargs["echo_repeat_from"]):
+        get_echo_runs(text, **kw)
 
-    if bold is True:
-        rta.SetFontWeight(wx.FONTWEIGHT_BOLD)
-    elif bold is False:
-        rta.SetFontWeight(wx.FONTWEIGHT_NORMAL)
 
-    if italic is True:
-        rta.SetFontStyle(wx.FONTSTYLE_ITALIC)
-    elif italic is False:
-        rta.SetFontStyle(wx.FONTSTYLE_NORMAL)
+def log_dropped_echo(item):
+    """Write a line dropped by a full echo queue to its log files anyway.
 
-    if underline is not None:
-        rta.SetFontUnderlined(underline)
+    The timestamp is the time of the drop.
+    """
+    text, kwargs = item
+    if kwargs.get("echo_repeat") and not kwargs.get("no_echo"):
+        return write_echo_repeats(text, kwargs)
 
-    rtc.BeginStyle(rta)
+    if kwargs.get("log_file") or kwargs.get("log_files"):
+        kwargs = dict(kwargs, no_echo=True)
+        if kwargs.get("ansi"):  # the parser of the pane is not thread safe
+            kwargs.update(ansi=True)
 
-    if ts_text and ts_style:
-        rtc.WriteText(ts_text)
+        get_echo_runs(text, **kwargs)
 
-    rtc.WriteText(cat_echo_text(text=utext, **kwargs))
-    rtc.EndStyle()
-    if nl:
-        rtc.Newline()
 
-    rtc.ShowPosition(rtc.GetLastPosition())
-    if clear:
-        rtc.Clear()
+def echo_text(
+    rtc,
+    text="",
+    fg=None,
+    bg=None,
+    ts=True,
+    nl=True,
+    italic=False,
+    align=None,
+    underline=False,
+    bold=False,
+    ts_style=False,
+    font=None,
+    size=None,
+    clear=False,
+    keep_date=True,
+    max_lines=0,
+    max_chars=0,
+    **kwargs
+):
+    if kwargs.get("ansi") is True:
+        kwargs.update(ansi=get_ansi_parser(rtc))
+
+    kwargs.update(
+        fg=fg,
+        bg=bg,
+        italic=italic,
+        align=align,
+        underline=underline,
+        bold=bold,
+        font=font,
+        size=size,
+    )
+    runs = get_echo_runs(text, ts, nl, ts_style, keep_date, **kwargs)
+    render_echo_runs(rtc, [] if clear else runs, clear, max_lines, max_chars)
+
+
+def echo_batch(rtc, lines, max_lines=0, max_chars=0, index=None):
+    """Echo [(text, kwargs), ...] with a single freeze/scroll for all.
+
+    index: EchoIndex told on which pane line each indexed line landed
+    """
+    runs = []
+    clear = False
+    rendered = []
+    base = line_no = get_echo_line_no(rtc) if index is not None else 0
+    for text, kwargs in lines:
+        if kwargs.get("echo_repeat") and not kwargs.get("no_echo"):
+            write_echo_repeats(text, kwargs)
+            render_echo_runs(rtc, runs, clear, max_lines, max_chars)
+            runs = []
+            clear = False
+            set_echo_suffix(rtc, wxe.REPEAT_FORMAT.format(kwargs["echo_repeat"]))
+            continue
+
+        if kwargs.get("ansi") is True:  # kwargs may be shared by lines
+            kwargs = dict(kwargs, ansi=get_ansi_parser(rtc))
+
+        line_runs = get_echo_runs(text, **kwargs)
+        if kwargs.get("clear"):
+            runs = []
+            rendered = []
+            line_no = base
+            clear = True
+            continue
+
+        if index is not None:
+            if "echo_seq" in kwargs:
+                rendered.append((kwargs["echo_seq"], line_no))
+
+            line_no += sum(t.count("\n") for _, t in line_runs)
+
+        runs.extend(line_runs)
+
+    render_echo_runs(rtc, runs, clear, max_lines, max_chars)
+    for seq, line_no in rendered:
+        index.set_pane_line(seq, line_no)
 
 
 def on_hide(self, evt=None):
     self.Hide()
 
 
+PROBE_LINES = 100  # first echo chunk, before the cost per line is known
+
+
 def on_echoing(self, **kwargs):
-    """Default method for echoing text."""
-    if self.is_echoing or not self.echo_lines:
+    """Default method for echoing text.
+
+    Lines are drained in chunks sized from the measured cost per line to
+    fill the rest of `budget_ms` (PROBE_LINES until a cost is measured, at
+    most `batch` lines if given), so a backlog is mostly rendered with one
+    freeze/scroll per tick. Then the echo timer is retuned to the backlog,
+    or without a timer the next drain is scheduled while lines are queued.
+    """
+    if self.is_echoing:
         return
 
     self.is_echoing = True
-    i = 0
-    batch = kwargs.get("batch", 100)
-    while i < batch and self.echo_lines:
-        line = self.echo_lines.pop(0)
-        self.echo_text(line[0], **line[1])
-        i += 1
-
-    self.is_echoing = False
+    batch = kwargs.get("batch", 0)
+    budget = kwargs.get("budget_ms", getattr(self, "echo_budget_ms", 40)) / 1000
+    cost = getattr(self, "echo_line_cost", 0)
+    max_lines = getattr(self, "echo_max_lines", 0)
+    max_chars = getattr(self, "echo_max_chars", 0)
+    index = getattr(self, "echo_index", None)
+    metrics = getattr(self, "echo_metrics", None)
+    rendered = 0
+    start = perf_counter()
+    try:
+        while self.echo_lines:
+            remaining = budget - (perf_counter() - start)
+            if remaining <= 0:
+                break
+
+            count = int(remaining / cost) if cost else PROBE_LINES
+            if batch:
+                count = min(count, batch)
+
+            lines = self.echo_lines.get_many(max(count, 1))
+            if not lines:
+                break
+
+            begin = perf_counter()
+            echo_batch(self.rtc, lines, max_lines, max_chars, index)
+            cost = (perf_counter() - begin) / len(lines)
+            rendered += len(lines)
+            if metrics is not None:
+                metrics.add_rendered(lines)
+
+    finally:
+        self.echo_line_cost = cost
+        if metrics is not None and rendered:
+            metrics.add_tick(perf_counter() - start)
+
+        self.is_echoing = False
+        # also after a bad line raised, or the queue would never wake again
+        if getattr(self, "echo_timer", None) is not None:
+            adapt_echo_timer(self)
+        elif self.echo_lines.end_drain():
+            wx.CallLater(int(self.echo_busy_ms), self.on_echo_wakeup)
+
+
+def format_echo_metrics(metrics):
+    """Short status bar text of BaseBase.get_echo_metrics()."""
+    text = "Q {}".format(metrics["queue_depth"])
+    if "lines_per_sec" in metrics:
+        text += " | {:.0f}/s | p99 {:.0f}ms".format(
+            metrics["lines_per_sec"], metrics["lag_p99_ms"]
+        )
+
+    dropped = metrics["dropped"] + metrics["file_dropped"]
+    if dropped:
+        text += " | drop {}".format(dropped)
+
+    return text
+
+
+def adapt_echo_timer(self):
+    """Tick fast while lines are queued, fall back to idle interval if not."""
+    timer = getattr(self, "echo_timer", None)
+    if timer is None:
+        return
+
+    ms = self.echo_busy_ms if self.echo_lines else self.echo_idle_ms
+    if ms != self.echo_interval:
+        self.echo_interval = ms
+        timer.Start(int(ms))
 
 
 def start_timer(timer, miliseconds=1000, one_shot=False):
@@ -74,16 +74,16 @@ def create_id():
 def set_tooltip(wgt, tooltip="", t=None):
     if tooltip:
         func = wgt.SetToolTipString if OLD_WX else wgt.SetToolTip
-        func(wdu.ttt(tooltip, t=t))
+        func(wxu.ttt(tooltip, t=t))
 
 
 def set_hint(wgt, hint="", t=None):
     if hint:
-        wgt.SetHint(wdu.ttt(hint, t=t))
+        wgt.SetHint(wxu.ttt(hint, t=t))
 
 
 def set_label(wgt, label="", t=None):
-    wgt.SetLabel(wdu.ttt(label, t=t))
+    wgt.SetLabel(wxu.ttt(label, t=t))
 
 
 def set_fg(wgt, fg=None):
@@ -134,14 +134,7 @@ def popup(parent=None, caption="caption", **kwargs):
     icon = kwargs.pop("icon", "i")
     msg = kwargs.pop("msg", "")
     icon = ICONS.get(icon, ICONS["i"])
-    if isinstance(msg, six.string_types):
-        if not isinstance(msg, six.text_type):
-            umsg = msg.decode(wdu.detect_encoding(msg)["encoding"])
-        else:
-            umsg = msg
-
-    else:
-        umsg = "{}".format(msg)
+    umsg = wxu.to_text(msg, "popup")
 
     if t:
         umsg = wdu.ttt(umsg, t)
@@ -200,14 +193,7 @@ def popup(parent=None, caption="caption", **kwargs):
 def popup_smd(parent=None, msg="", caption="Message", **kwargs):
     t = kwargs.get("t")
     btn_label = kwargs.get("btn_label", "OK")
-    if isinstance(msg, six.string_types):
-        if not isinstance(msg, six.text_type):
-            umsg = msg.decode(wdu.detect_encoding(msg)["encoding"])
-        else:
-            umsg = msg
-
-    else:
-        umsg = "{}".format(msg)
+    umsg = wxu.to_text(msg, "popup")
 
     if t:
         btn_label = wdu.ttt(btn_label, t)
@@ -247,14 +233,7 @@ def popup_with_image(parent=None, img=None, caption="", msg="", **kwargs):
     btn = kwargs.pop("btn", wx.YES | wx.NO)
     need_return = kwargs.pop("need_return", False)
     size = kwargs.pop("size", None)
-    if isinstance(msg, six.string_types):
-        if not isinstance(msg, six.text_type):
-            umsg = msg.decode(wdu.detect_encoding(msg)["encoding"])
-        else:
-            umsg = msg
-
-    else:
-        umsg = "{}".format(msg)
+    umsg = wxu.to_text(msg, "popup")
 
     if t:
         umsg = wdu.ttt(umsg, t)
@@ -486,6 +465,16 @@ def add_richtext(parent, id=-1, **kwargs):
     return rtc
 
 
+def add_logview(parent, id=-1, **kwargs):
+    import wxbreads.logview as wxlv
+
+    font = kwargs.pop("font", None)
+    max_lines = kwargs.pop("max_lines", 100000)
+    view = wxlv.LogView(parent, id, max_lines=max_lines, **kwargs)
+    set_font(view, font)
+    return view
+
+
 def quick_add_rtc(parent, sizer, size=(-1, 200), readonly=True, prop=1, flag="e,a"):
     rtc = add_richtext(parent, size=size, readonly=readonly)
     pack(rtc, sizer, prop=prop, flag=flag)
@@ -1296,6 +1285,12 @@ def quick_quit(self, **kwargs):
     elif hasattr(self, "other_clean_work"):
         self.other_clean_work()
 
+    if hasattr(self, "close_echo"):
+        self.close_echo()
+
+    if hasattr(self, "log_sinks"):
+        self.log_sinks.close()
+
     self.Destroy()
     return True
 
@@ -1645,6 +1640,7 @@ def quick_big_buttons(
 
 
 add_rich_text = add_richtext
+add_log_view = add_logview
 add_status_bar = add_statusbar
 add_date_picker = add_datepicker
 add_time_ctrl = add_timectrl